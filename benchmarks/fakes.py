@@ -0,0 +1,181 @@
+"""Stand-ins for the discord objects the bot uses, without a gateway connection.
+Every method that would be a REST call in production only increments FakeBot.api_calls,
+such that the benchmarks can report the amount of API calls per operation."""
+from datetime import timedelta
+from types import SimpleNamespace
+
+import discord
+from discord.ext import commands
+
+
+def create_user(discord_id: int) -> discord.User:
+    return discord.User(state=None, data={
+        "id": str(discord_id),
+        "username": f"user{discord_id}",
+        "discriminator": "0",
+        "avatar": None,
+        "global_name": None,
+    })
+
+
+class FakeBot(commands.Bot):
+    """Satisfies what ModelContext.bot is used for by the models and cogs"""
+    application_id = 1
+
+    def __init__(self, *, guilds=(), users=()):
+        # commands.Bot.__init__ is skipped on purpose, it would set up a connection state.
+        self._guilds = list(guilds)
+        self._users = {user.id: user for user in users}
+        self._bot_user = create_user(self.application_id)
+        self.api_calls = 0
+
+        self.date_format = "%d %b %Y"
+        self.derelict_time = timedelta(days=10)
+        self.user_delete_time = timedelta(days=93)
+        self.activity_flush_interval = timedelta(seconds=30)
+        self.derelict_sweep_interval = timedelta(hours=1)
+
+    @property
+    def guilds(self):
+        return self._guilds
+
+    @property
+    def user(self):
+        return self._bot_user
+
+    def get_user(self, discord_id, /):
+        return self._users.get(discord_id)
+
+    async def fetch_user(self, discord_id, /):
+        self.api_calls += 1
+        return create_user(discord_id)
+
+    def get_guild(self, guild_id, /):
+        return discord.utils.get(self._guilds, id=guild_id)
+
+    def get_channel(self, channel_id, /):
+        for guild in self._guilds:
+            channel = guild.get_channel(channel_id)
+            if channel is not None:
+                return channel
+        return None
+
+    async def fetch_channel(self, channel_id, /):
+        self.api_calls += 1
+        return self.get_channel(channel_id)
+
+    async def is_owner(self, user):
+        return False
+
+
+class FakeApplicationContext(discord.ApplicationContext):
+    """An ApplicationContext of a slash command invoked by user"""
+
+    def __init__(self, *, bot: FakeBot, user: discord.User):
+        self.bot = bot
+        self._user = user
+        self.responses = []
+
+    @property
+    def user(self):
+        return self._user
+
+    async def respond(self, *args, **kwargs):
+        self.bot.api_calls += 1
+        self.responses.append((args, kwargs))
+
+
+class FakeRole:
+    def __init__(self, role_id: int, name: str):
+        self.id = role_id
+        self.name = name
+
+
+class FakeMember:
+    def __init__(self, discord_id: int, *, bot: FakeBot):
+        self.id = discord_id
+        self.bot = False
+        self.roles = []
+        self._bot = bot
+
+    async def add_roles(self, *roles):
+        self._bot.api_calls += 1
+        self.roles.extend(roles)
+
+    async def remove_roles(self, *roles):
+        self._bot.api_calls += 1
+        for role in roles:
+            self.roles.remove(role)
+
+
+class FakeMessage:
+    def __init__(self, message_id: int, *, bot: FakeBot, emojis=()):
+        self.id = message_id
+        self.reactions = [SimpleNamespace(emoji=emoji, me=True) for emoji in emojis]
+        self._bot = bot
+
+    async def add_reaction(self, emoji):
+        self._bot.api_calls += 1
+
+    async def remove_reaction(self, emoji, member):
+        self._bot.api_calls += 1
+
+
+class FakeHistory:
+    def __init__(self, messages):
+        self.messages = messages
+
+    async def flatten(self):
+        return self.messages
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int, *, guild, bot: FakeBot):
+        self.id = channel_id
+        self.guild = guild
+        self.mention = f"<#{channel_id}>"
+        self.jump_url = f"https://discord.com/channels/{guild.id}/{channel_id}"
+        self.messages = []
+        self._bot = bot
+
+    def history(self, limit=100):
+        self._bot.api_calls += 1
+        return FakeHistory(self.messages[-limit:])
+
+    def get_partial_message(self, message_id):
+        return discord.utils.get(self.messages, id=message_id)
+
+    async def send(self, *args, **kwargs):
+        self._bot.api_calls += 1
+
+
+class FakeGuild:
+    def __init__(self, guild_id: int, *, members, roles, bot: FakeBot):
+        self.id = guild_id
+        self.name = f"guild{guild_id}"
+        self.members = members
+        self.roles = roles
+        self.channels = []
+        self.system_channel = None
+        self._bot = bot
+
+    def get_channel(self, channel_id):
+        return discord.utils.get(self.channels, id=channel_id)
+
+    def get_role(self, role_id):
+        return discord.utils.get(self.roles, id=role_id)
+
+    def get_member(self, member_id):
+        return discord.utils.get(self.members, id=member_id)
+
+
+def create_reaction_payload(*, guild: FakeGuild, channel: FakeChannel, message: FakeMessage, member: FakeMember, emoji: str):
+    """An object with the attributes of a RawReactionActionEvent"""
+    return SimpleNamespace(
+        guild_id=guild.id,
+        channel_id=channel.id,
+        message_id=message.id,
+        user_id=member.id,
+        member=member,
+        emoji=discord.PartialEmoji(name=emoji),
+    )
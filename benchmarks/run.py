@@ -0,0 +1,98 @@
+"""Offline benchmark suite for the Player model and the database layer.
+
+Runs scripted workloads against Ming's in memory datastore (mim) and fake discord objects,
+such that no MongoDB, gateway or bot token is needed. For every dataset size and workload it
+reports the throughput, the p50 and p99 latency and the discord API calls per operation.
+
+Usage, from the root of the repository:
+    python benchmarks/run.py
+    python benchmarks/run.py --users 1000 10000 --ops 200 --only Player._init reaction_role
+    python benchmarks/run.py --json results.json
+
+Numbers are meant to be compared between commits on the same machine, mim is no stand-in for
+the absolute performance of a real MongoDB."""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), "src"))
+
+from discord.ext import commands  # noqa: E402, needs to be imported before the bot modules
+
+from database.connect import DBManager  # noqa: E402
+
+# The datastore has to exist before the mapped classes are imported.
+DBManager(uri="mim://localhost/benchmark")
+
+from workloads import WORKLOADS, seed  # noqa: E402
+
+DBManager.compile_mappers()
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    return sorted_values[round(fraction * (len(sorted_values) - 1))]
+
+
+async def run_workload(env, workload, ops: int) -> dict:
+    latencies = []
+    api_calls = env.bot.api_calls
+    start = time.perf_counter()
+    for index in range(ops):
+        op_start = time.perf_counter()
+        await workload(env, index)
+        latencies.append(time.perf_counter() - op_start)
+    total = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "ops": ops,
+        "ops_per_second": ops / total,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "api_calls_per_op": (env.bot.api_calls - api_calls) / ops,
+    }
+
+
+async def main(args) -> list:
+    results = []
+    for users in args.users:
+        print(f"Seeding {users} users")
+        env = await seed(users, rng=random.Random(args.seed))
+        for name, (workload, max_ops) in WORKLOADS.items():
+            if args.only and name not in args.only:
+                continue
+            ops = args.ops if max_ops is None else min(args.ops, max_ops)
+            result = await run_workload(env, workload, ops)
+            result.update(users=users, workload=name)
+            results.append(result)
+            print(
+                f"  {name:<32}{result['ops_per_second']:>10.1f} ops/s"
+                f"{result['p50_ms']:>10.3f} ms p50{result['p99_ms']:>10.3f} ms p99"
+                f"{result['api_calls_per_op']:>8.2f} api calls/op"
+            )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="dataset sizes to run the workloads against")
+    parser.add_argument("--ops", type=int, default=500,
+                        help="operations per workload")
+    parser.add_argument("--only", nargs="+", choices=list(WORKLOADS),
+                        help="only run these workloads")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed of the random choices of the workloads")
+    parser.add_argument("--json", metavar="PATH",
+                        help="also write the results to a json file")
+    args = parser.parse_args()
+
+    results = asyncio.run(main(args))
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
@@ -0,0 +1,86 @@
+"""Per call overhead of runtime type-checking, for every TYPECHECK policy.
+
+The policy is applied when the bot modules are imported, so every policy is measured in its own
+interpreter. The timed calls are hot paths wrapped in @typechecked: Player properties that are
+evaluated many times per command, Player methods and helpers.
+
+Usage, from the root of the repository:
+    python benchmarks/typecheck.py
+    python benchmarks/typecheck.py --calls 200000 --sample-rate 0.05"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import timeit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+POLICIES = ("off", "sample", "strict")
+
+
+async def measure(calls: int) -> dict:
+    sys.path.insert(0, HERE)
+    sys.path.insert(0, os.path.join(os.path.dirname(HERE), "src"))
+
+    from discord.ext import commands  # noqa: F401, needs to be imported before the bot modules
+    from database.connect import DBManager
+    DBManager(uri="mim://localhost/benchmark")
+
+    from database.user import DBUser
+    from models import Player, ModelNoneCTX
+    from utils import mention_to_id
+    from fakes import FakeBot
+    DBManager.compile_mappers()
+
+    await DBUser.register(1000)
+    player = await Player.from_db_user(
+        await DBUser.get_record(discord_id=1000),
+        context=ModelNoneCTX(bot=FakeBot()),
+        get_discord=False
+    )
+
+    statements = {
+        "Player.derelict": lambda: player.derelict,
+        "Player.has_owner": lambda: player.has_owner,
+        "Player.last_active_str": lambda: player.last_active_str,
+        "Player.is_owned_by": lambda: player.is_owned_by(player),
+        "mention_to_id": lambda: mention_to_id("<@!1000>"),
+        "DBUser.collection": lambda: DBUser.collection,
+    }
+    return {
+        name: min(timeit.repeat(statement, number=calls, repeat=5)) / calls * 1e9
+        for name, statement in statements.items()
+    }
+
+
+def main(args):
+    results = {}
+    for policy in POLICIES:
+        env = dict(os.environ, TYPECHECK=policy, TYPECHECK_SAMPLE_RATE=str(args.sample_rate))
+        output = subprocess.run(
+            [sys.executable, __file__, "--child", "--calls", str(args.calls)],
+            env=env, check=True, capture_output=True, text=True
+        ).stdout
+        results[policy] = json.loads(output.splitlines()[-1])
+
+    print(f"{'ns/call':<24}" + "".join(f"{policy:>10}" for policy in POLICIES) + f"{'removed':>10}")
+    for name in results["off"]:
+        row = "".join(f"{results[policy][name]:>10.0f}" for policy in POLICIES)
+        removed = results["strict"][name] - results["off"][name]
+        print(f"{name:<24}{row}{removed:>10.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=100000,
+                        help="calls per measurement")
+    parser.add_argument("--sample-rate", type=float, default=0.01,
+                        help="TYPECHECK_SAMPLE_RATE of the sample policy")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(measure(args.calls))))
+    else:
+        main(args)
@@ -0,0 +1,159 @@
+"""The scripted workloads of the benchmark suite, and the database seeding they run against."""
+import random
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import discord
+from bson.objectid import ObjectId
+
+from database.connect import DBManager
+from database.server import ServerSettings, _settings_cache, _emoji_roles_cache
+from database.user import DBUser, RefCountUpdater, last_active_tracker
+from models import Player, ModelNoneCTX, create_player
+from utils import user_resolver
+from fakes import (
+    FakeBot, FakeGuild, FakeMember, FakeRole, FakeChannel, FakeMessage, FakeApplicationContext,
+    create_user, create_reaction_payload
+)
+
+FIRST_DISCORD_ID = 1000
+# Every OWNERSHIP_GROUP users, the first one owns the next OWNED_PER_OWNER
+OWNERSHIP_GROUP = 20
+OWNED_PER_OWNER = 5
+GUILD_ID = 10
+ROLE_CHANNEL_ID = 11
+ROLE_MESSAGE_ID = 12
+EMOJIS = ["❤️", "💜", "💙", "💚", "red", "green", "blue"]
+
+
+async def seed(user_count: int, *, rng: random.Random) -> SimpleNamespace:
+    """Resets the datastore and all in-process caches, and fills it with user_count users.
+    Returns the environment the workloads run in."""
+    # Emptied per collection, mim keeps the documents of collections that are already bound when dropping the database
+    for collection in DBManager.db.collection_names():
+        DBManager.db[collection].delete_many({})
+    _settings_cache.clear()
+    _emoji_roles_cache.clear()
+    last_active_tracker.pending.clear()
+    last_active_tracker.forget_all()
+    user_resolver._cache.clear()
+
+    # The documents are inserted directly, with a document created through the ODM as template.
+    await DBUser.register(FIRST_DISCORD_ID)
+    template = DBUser.collection.find_one({"discord_id": FIRST_DISCORD_ID})
+    DBUser.collection.delete_many({})
+
+    now = datetime.utcnow()
+    documents = []
+    owners = []
+    for index in range(user_count):
+        document = dict(template)
+        document["_id"] = ObjectId()
+        document["discord_id"] = FIRST_DISCORD_ID + index
+        document["blocked"] = []
+        document["last_active"] = now - timedelta(days=rng.randint(0, 30))
+        position = index % OWNERSHIP_GROUP
+        if position == 0:
+            owners.append(document["_id"])
+            document["controller"] = document["_id"]
+        elif position <= OWNED_PER_OWNER:
+            document["controller"] = owners[-1]
+        else:
+            document["controller"] = document["_id"]
+        documents.append(document)
+    DBUser.collection.insert_many(documents)
+    await DBUser.load_ownership()
+
+    discord_ids = [document["discord_id"] for document in documents]
+    bot = FakeBot(users=[create_user(discord_id) for discord_id in discord_ids])
+
+    roles = [FakeRole(100 + index, name) for index, name in enumerate(
+        ["she/her", "they/them", "he/him", "safe", "red", "green", "blue"])]
+    members = [FakeMember(discord_id, bot=bot) for discord_id in discord_ids]
+    guild = FakeGuild(GUILD_ID, members=members, roles=roles, bot=bot)
+    # Half of the users are also in a second guild, to have reference counts above one
+    second_guild = FakeGuild(GUILD_ID + 1, members=members[::2], roles=[], bot=bot)
+    channel = FakeChannel(ROLE_CHANNEL_ID, guild=guild, bot=bot)
+    message = FakeMessage(ROLE_MESSAGE_ID, bot=bot, emojis=EMOJIS)
+    channel.messages.append(message)
+    guild.channels.append(channel)
+    bot._guilds = [guild, second_guild]
+
+    await ServerSettings.enter_server(GUILD_ID, channel_id=ROLE_CHANNEL_ID)
+    await ServerSettings.change_setting(GUILD_ID, "role_channel", ROLE_CHANNEL_ID)
+    for emoji, role in zip(EMOJIS, roles):
+        await ServerSettings.set_reaction_role(GUILD_ID, emoji, role.id)
+
+    context = ModelNoneCTX(bot=bot)
+    owner_players = [
+        await Player.from_db_user(
+            await DBUser.get_record(db_id=owner_id), context=context, get_discord=False)
+        for owner_id in owners[:100]
+    ]
+
+    from cogs.role_select import ReactionRoles
+    from cogs.controlling import Controlling
+
+    return SimpleNamespace(
+        bot=bot,
+        rng=rng,
+        discord_ids=discord_ids,
+        owner_players=owner_players,
+        guild=guild,
+        channel=channel,
+        message=message,
+        reaction_roles=ReactionRoles(bot),
+        controlling=Controlling(bot),
+        updater=RefCountUpdater(bot=bot),
+    )
+
+
+async def player_init(env: SimpleNamespace, index: int):
+    await create_player(
+        discord_id=env.rng.choice(env.discord_ids),
+        get_db=True,
+        context=ModelNoneCTX(bot=env.bot)
+    )
+
+
+async def player_get_owned(env: SimpleNamespace, index: int):
+    await env.owner_players[index % len(env.owner_players)].get_owned()
+
+
+async def control_owned(env: SimpleNamespace, index: int):
+    """/control owned, through the ApplicationContext and ModelACTX path of a slash command"""
+    owner = env.owner_players[index % len(env.owner_players)]
+    ctx = FakeApplicationContext(bot=env.bot, user=env.bot.get_user(owner.db.discord_id))
+    command = discord.utils.get(env.controlling.control.subcommands, name="owned")
+    await env.controlling.cog_before_invoke(ctx)
+    await command.callback(env.controlling, ctx)
+
+
+async def update_database(env: SimpleNamespace, index: int):
+    await env.updater()
+
+
+async def change_setting(env: SimpleNamespace, index: int):
+    await ServerSettings.change_setting(GUILD_ID, "run_welcome_message", bool(index % 2))
+
+
+async def reaction_role(env: SimpleNamespace, index: int):
+    payload = create_reaction_payload(
+        guild=env.guild,
+        channel=env.channel,
+        message=env.message,
+        member=env.rng.choice(env.guild.members),
+        emoji=env.rng.choice(EMOJIS)
+    )
+    await env.reaction_roles.on_raw_reaction_add(payload)
+
+
+# name: (workload, maximum amount of operations)
+WORKLOADS = {
+    "Player._init": (player_init, None),
+    "Player.get_owned": (player_get_owned, None),
+    "/control owned": (control_owned, None),
+    "DBUser.update_database": (update_database, 3),
+    "ServerSettings.change_setting": (change_setting, None),
+    "reaction_role": (reaction_role, None),
+}
@@ -1,18 +1,25 @@
 import asyncio
 import logging
+import time
 
 import discord
 from discord.ext import commands
 
-from database.user import DBUser
+from database.user import DBUser, last_active_tracker
 from models import ManagedCommandError
+from utils import metrics
 
 
 class BaseCog(commands.Cog):
     """The base cog all other cogs should inherit from
     Features:
     - Error handeling last resort (replies with the error if something goes wrong)
-    - Registering the player or updating their last_active when a slash command is used"""
+    - Registering the player or updating their last_active when a slash command is used
+        (last_active updates are batched by the last_active_tracker, only registering hits the database)
+        Cogs that should not do this set track_activity to False
+    - Recording the duration of every slash command"""
+
+    track_activity = True
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -35,4 +42,19 @@ class BaseCog(commands.Cog):
         self,
         ctx: discord.ApplicationContext
     ):
-        DBUser.update(ctx.user.id)
+        ctx.invoke_started = time.perf_counter()
+        if self.track_activity and not last_active_tracker.touch(ctx.user.id):
+            await DBUser.update(ctx.user.id)
+
+    async def cog_after_invoke(
+        self,
+        ctx: discord.ApplicationContext
+    ):
+        # Also called when the command raised an error
+        started = getattr(ctx, "invoke_started", None)
+        if started is not None:
+            metrics.observe(
+                "command_duration_seconds",
+                time.perf_counter() - started,
+                command=ctx.command.qualified_name
+            )
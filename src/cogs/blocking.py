@@ -6,7 +6,7 @@ from typing import List, Coroutine
 import discord
 from discord.commands import SlashCommandGroup, Option
 
-from database.user import DBUser
+from database.user import DBUser, UserNotRegisterd
 from utils import mention_to_id, get_player_name
 from models import Player, ModelACTX
 from .base import BaseCog
@@ -36,7 +36,7 @@ class Blocking(BaseCog):
             await ctx.respond("You cannot block yourself, silly!", ephemeral=True)
             return
         try:
-            DBUser.block(ctx.user.id, player.discord.id)
+            await DBUser.block(ctx.user.id, player.discord.id)
             await ctx.respond(f"Blocked {player.discord}", ephemeral=True)
         except ValueError:
             await ctx.respond(f"{player.discord} was already blocked", ephemeral=True)
@@ -57,7 +57,7 @@ class Blocking(BaseCog):
         player_id: int = mention_to_id(player)
         player_name: str = await get_player_name(player_id, bot=self.bot)
         try:
-            DBUser.block(ctx.user.id, player_id, unblock=True)
+            await DBUser.block(ctx.user.id, player_id, unblock=True)
             await ctx.respond(f"Unblocked {player_name}", ephemeral=True)
         except ValueError:
             await ctx.respond(f"{player_name} was never blocked", ephemeral=True)
@@ -69,16 +69,20 @@ class Blocking(BaseCog):
         self,
         ctx: discord.ApplicationContext
     ):
-        player: Player = await Player.from_ctx(ctx, get_db=True)
+        try:
+            blocked: List[int] = await DBUser.get_blocked(ctx.user.id)
+        except UserNotRegisterd:
+            await ctx.respond("You don't have anyone blocked", ephemeral=True)
+            return
         # Not using the Player model to allow for deletion of removed discord accounts
         coroutines: List[Coroutine] = [get_player_name(
-            blocked_id, bot=self.bot) for blocked_id in player.db.blocked]
+            blocked_id, bot=self.bot) for blocked_id in blocked]
         names: List[str] = await asyncio.gather(*coroutines)
         if names == []:
             await ctx.respond("You don't have anyone blocked", ephemeral=True)
         else:
             entries = []
-            for name, id in zip(names, player.db.blocked):
+            for name, id in zip(names, blocked):
                 entries.append(f"{name}.\tID: {id}")
             await ctx.respond("\n".join(entries), ephemeral=True)
 
@@ -1,4 +1,5 @@
 import asyncio
+import io
 import logging
 
 import discord
@@ -6,6 +7,7 @@ from discord.ext import commands
 from discord.commands import slash_command, Option
 
 from models import Player
+from utils import metrics, loop_lag_monitor, startup_timer, timed_listener, sched, run_job_now
 from cogs import extensions
 from .base import BaseCog
 
@@ -59,6 +61,77 @@ class BotManager(BaseCog):
 
         await ctx.respond(f"{to_update} got {action}ed", ephemeral=True)
 
+    @slash_command(
+        name="metrics",
+        description="export the performance metrics of the bot")
+    @commands.is_owner()
+    async def export_metrics(
+        self,
+        ctx: discord.ApplicationContext,
+        export_format: Option(
+            input_type=str,
+            name="format",
+            description="The format of the export",
+            choices=[
+                "prometheus",
+                "json"
+            ]
+        ),
+        reset: Option(
+            input_type=bool,
+            name="reset",
+            description="Reset the metrics after exporting them",
+            default=False
+        )
+    ):
+        # Redundency
+        player = await Player.from_ctx(ctx)
+        if not await player.is_administrator():
+            await ctx.respond(f"You do not have permission to use this command", ephemeral=True)
+            return
+
+        if export_format == "json":
+            snapshot, filename = metrics.to_json(), "metrics.json"
+        else:
+            snapshot, filename = metrics.to_prometheus(), "metrics.txt"
+        if reset:
+            metrics.reset()
+
+        await ctx.respond(
+            file=discord.File(io.BytesIO(snapshot.encode()), filename=filename),
+            ephemeral=True
+        )
+
+    @slash_command(
+        name="job",
+        description="run a scheduled job now")
+    @commands.is_owner()
+    async def run_job(
+        self,
+        ctx: discord.ApplicationContext,
+        job_id: Option(
+            input_type=str,
+            name="job",
+            description="The id of the scheduled job",
+            autocomplete=discord.utils.basic_autocomplete(
+                lambda ctx: [job.id for job in sched.get_jobs()])
+        )
+    ):
+        # Redundency
+        player = await Player.from_ctx(ctx)
+        if not await player.is_administrator():
+            await ctx.respond(f"You do not have permission to use this command", ephemeral=True)
+            return
+
+        if not run_job_now(job_id):
+            await ctx.respond(f"There is no scheduled job `{job_id}`", ephemeral=True)
+            return
+        # The run itself is reported in the logs and the scheduled_job metrics
+        await ctx.respond(
+            f"Started `{job_id}`, unless it is still running. See `/metrics` for its duration and rows touched",
+            ephemeral=True
+        )
+
     async def set_status(self):
         await self.bot.change_presence(
             status=discord.Status.online,
@@ -69,8 +142,11 @@ class BotManager(BaseCog):
         )
 
     @commands.Cog.listener()
+    @timed_listener
     async def on_ready(self):
         await self.set_status()
+        loop_lag_monitor.start()
+        startup_timer.ready()
 
     def cog_unload(self):
         logging.info("Cog Bot Management Unloaded")
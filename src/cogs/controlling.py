@@ -92,7 +92,7 @@ class Controlling(BaseCog):
 
         owner: Optional[Player] = await player.get_owner(get_discord=True)
 
-        DBUser.change_setting(
+        await DBUser.change_setting(
             db_id=player.db._id,
             setting="trusts",
             value=True
@@ -124,7 +124,7 @@ class Controlling(BaseCog):
         elif not target.is_owned_by(instantiator):
             await ctx.respond(f"You do not control {target.discord.mention}.", ephemeral=True)
             return
-        target._set_owner(target, trusts=False)
+        await target._set_owner(target, trusts=False)
         await target.notify(f"You are no longer owned by {instantiator.discord.mention}. They freed you")
 
         await ctx.respond(f"You freed {target.discord.mention}", ephemeral=True)
@@ -194,7 +194,7 @@ class Controlling(BaseCog):
         ctx: discord.ApplicationContext,
         value: Option(bool)
     ):
-        DBUser.change_setting(
+        await DBUser.change_setting(
             discord_id=ctx.user.id,
             setting="allow_requests",
             value=bool(value)
@@ -1,21 +1,29 @@
 import asyncio
 import logging
+from typing import List, Tuple
 
 import discord
 from discord.ext import commands
 from discord.commands import SlashCommandGroup
 
-from utils import sched, scheduler_setup
+from utils import sched, scheduler_setup, timed_listener, WindowBatcher
 from database.user import DBUser, UserAlreadyRegisterd, UserNotRegisterd
-from models import Player, create_player, ModelNoneCTX
+from database.server import ServerSettings
+from database.notifications import NotificationOutbox
+from models import Player, create_player, ModelNoneCTX, notification_worker
 from .base import BaseCog
 
 
 class PlayerManager(BaseCog):
     data = SlashCommandGroup("data", "Manage the data the bot has on you")
 
+    # In this cog, commands should not call DBUser.update()
+    track_activity = False
+
     def __init__(self, bot):
         self.bot = bot
+        # Collects the joins per guild in burst mode
+        self.join_batcher = WindowBatcher(self.join_burst)
 
     @data.command(
         name="register",
@@ -25,7 +33,7 @@ class PlayerManager(BaseCog):
             ctx: discord.ApplicationContext
     ):
         try:
-            DBUser.register(ctx.user.id)
+            await DBUser.register(ctx.user.id)
             await ctx.respond(f"Registered {ctx.user.mention}", ephemeral=True)
         except UserAlreadyRegisterd:
             await ctx.respond(f"Player {ctx.user.mention} was already registered", ephemeral=True)
@@ -54,7 +62,7 @@ class PlayerManager(BaseCog):
             pass
 
         try:
-            DBUser.unregister(discord_id=ctx.user.id)
+            await DBUser.unregister(discord_id=ctx.user.id)
             await ctx.respond(f"unregistered {ctx.user.mention}", ephemeral=True)
         except UserNotRegisterd:
             await ctx.respond(f"Player {ctx.user.mention} was never registered", ephemeral=True)
@@ -67,7 +75,7 @@ class PlayerManager(BaseCog):
             ctx: discord.ApplicationContext
     ):
         references = len(ctx.user.mutual_guilds)
-        DBUser.update(ctx.user.id, ref_count=references)
+        await DBUser.update(ctx.user.id, ref_count=references)
         await ctx.respond(f"Updated {ctx.user.mention}'s database entry", ephemeral=True)
 
     @data.command(
@@ -78,57 +86,86 @@ class PlayerManager(BaseCog):
             ctx: discord.ApplicationContext
     ):
         try:
-            await ctx.respond(DBUser.get_settings(ctx.user.id), ephemeral=True)
+            await ctx.respond(await DBUser.get_settings(ctx.user.id), ephemeral=True)
         except UserNotRegisterd:
             await ctx.respond(f"No data found for {ctx.user.mention}", ephemeral=True)
 
     @commands.Cog.listener()
+    @timed_listener
     async def on_member_join(self, member: discord.Member):
         if member.bot:
             return
-        DBUser.join(member.id)
+        settings = await ServerSettings.get_settings(member.guild.id)
+        if settings is not None and settings.burst_mode:
+            self.join_batcher.add(member.guild.id, member.id, window=settings.burst_window)
+        else:
+            await DBUser.join(member.id)
+
+    async def join_burst(self, guild_id: int, discord_ids: List[int]):
+        await DBUser.join_many(discord_ids)
 
     @commands.Cog.listener()
+    @timed_listener
     async def on_member_remove(self, member: discord.Member):
         if member.bot:
             return
-        DBUser.leave(member.id, delete_time=self.bot.user_delete_time)
+        await DBUser.leave(member.id, delete_time=self.bot.user_delete_time)
 
     @commands.Cog.listener()
+    @timed_listener
     async def on_guild_join(self, guild: discord.Guild):
-        for member in guild.members:
-            if member.bot:
-                continue
-            DBUser.join(member.id)
+        await DBUser.join_many([member.id for member in guild.members if not member.bot])
 
     @commands.Cog.listener()
+    @timed_listener
     async def on_guild_remove(self, guild: discord.Guild):
-        for member in guild.members:
-            if member.bot:
-                continue
-            DBUser.leave(member.id, delete_time=self.bot.user_delete_time)
+        await DBUser.leave_many(
+            [member.id for member in guild.members if not member.bot],
+            delete_time=self.bot.user_delete_time
+        )
 
     @commands.Cog.listener()
+    @timed_listener
     async def on_connect(self):
-        DBUser.init_updater(bot=self.bot)
+        DBUser.init_updater(bot=self.bot, on_released=self.notify_derelict_owners)
 
     @commands.Cog.listener()
+    @timed_listener
     async def on_ready(self):
-        scheduler_setup()
+        # The ownership map is loaded from all users, but only kept in sync with the controller writes of this process.
+        # When other processes run the other shards, their writes would make it stale, so get_owned keeps querying the database.
+        if self.bot.runs_all_shards:
+            await DBUser.load_ownership()
+        notification_worker.start(self.bot)
+        scheduler_setup(self.bot.jobs_collection)
         sched.add_job(
             "database:user.database_updater",
             "cron", hour=2,
             id="update_database",
+            # Still run the nightly update if the bot was down at 2:00, but came back up within the hour
+            misfire_grace_time=3600,
+            replace_existing=True
+        )
+        sched.add_job(
+            "database:user.flush_last_active",
+            "interval", seconds=self.bot.activity_flush_interval.total_seconds(),
+            id="flush_last_active",
+            replace_existing=True
+        )
+        sched.add_job(
+            "database:user.derelict_sweeper",
+            "interval", seconds=self.bot.derelict_sweep_interval.total_seconds(),
+            id="sweep_derelict",
             replace_existing=True
         )
 
-    # In this cog, commands should not call Player.update()
-    # Therefore, BaseCog behaviour needs to be overwritten
-    async def cog_before_invoke(
-        self,
-        ctx: discord.ApplicationContext
-    ):
-        pass
+    async def notify_derelict_owners(self, released: List[Tuple[int, int]]):
+        """Notifies the owners that lost a player in the derelict sweep"""
+        await NotificationOutbox.enqueue_many([
+            (owner_id, f"<@{owned_id}> is no longer owned by you because you went derelict")
+            for owner_id, owned_id in released
+        ])
+        notification_worker.wake()
 
     def cog_unload(self):
         logging.info("Cog PlayerManagement unloaded")
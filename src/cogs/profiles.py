@@ -27,10 +27,8 @@ class Profiles(BaseCog):
                 description="The user to get the profile from"
             )
     ):
-        player: Player = await Player.from_mention(
+        player: Player = await Player.profile_from_mention(
             player,
-            get_discord=True,
-            get_db=True,
             context=ModelACTX(ctx)
         )
         try:
@@ -1,5 +1,6 @@
 import asyncio
 import logging
+from typing import Dict, Optional, Set, Tuple
 
 import discord
 from discord import RawReactionActionEvent, Permissions
@@ -8,7 +9,7 @@ from discord.commands import SlashCommandGroup, Option
 
 from database.server import ServerSettings
 from models import MainTextChannel, ModelACTX
-from utils import MessageChannel
+from utils import MessageChannel, timed_listener
 from .base import BaseCog
 
 
@@ -28,6 +29,10 @@ class ReactionRoles(BaseCog):
             "💙": "he/him",
             "💚": "safe"
         }
+        # Per guild emoji -> role id, see get_default_emoji_roles
+        self.default_emoji_roles: Dict[int, Dict[str, int]] = {}
+        # (message id, emoji) pairs the bot is known to have reacted with
+        self.ensured_reactions: Set[Tuple[int, str]] = set()
 
     @roles.command(
         name="channel",
@@ -42,10 +47,74 @@ class ReactionRoles(BaseCog):
             )
     ):
         channel = await MainTextChannel.from_mention(channel_mention, context=ModelACTX(ctx))
-        ServerSettings.change_setting(
+        await ServerSettings.change_setting(
             ctx.guild.id, "role_channel", int(channel.discord.id))
         await ctx.respond(f"The role channel has been changed to {channel.discord.mention}", ephemeral=True)
 
+    @roles.command(
+        name="add",
+        description="let an emoji in role-select give a role")
+    async def add_reaction_role(
+            self,
+            ctx: discord.ApplicationContext,
+            emoji: Option(
+                input_type=str,
+                name="emoji",
+                description="The emoji members react with"
+            ),
+            role: Option(
+                input_type=discord.Role,
+                name="role",
+                description="The role the emoji gives"
+            )
+    ):
+        emoji_name = discord.PartialEmoji.from_str(emoji).name
+        await ServerSettings.set_reaction_role(ctx.guild.id, emoji_name, role.id)
+        await ctx.respond(f"{emoji} now gives {role.mention}", ephemeral=True)
+
+    @roles.command(
+        name="remove",
+        description="stop an emoji in role-select from giving a role")
+    async def remove_reaction_role(
+            self,
+            ctx: discord.ApplicationContext,
+            emoji: Option(
+                input_type=str,
+                name="emoji",
+                description="The emoji members react with"
+            )
+    ):
+        emoji_name = discord.PartialEmoji.from_str(emoji).name
+        await ServerSettings.set_reaction_role(ctx.guild.id, emoji_name, None)
+        await ctx.respond(f"{emoji} no longer gives a role", ephemeral=True)
+
+    @roles.command(
+        name="list",
+        description="list the emojis of role-select and their roles")
+    async def list_reaction_roles(self, ctx: discord.ApplicationContext):
+        emoji_roles = await ServerSettings.get_emoji_roles(ctx.guild.id)
+        if not emoji_roles:
+            await ctx.respond(
+                "No emojis are configured, role-select uses the roles with the name of the emoji.", ephemeral=True)
+            return
+
+        lines = [f"{emoji}: <@&{role_id}>" for emoji, role_id in emoji_roles.items()]
+        await ctx.respond("\n".join(lines), ephemeral=True)
+
+    def get_default_emoji_roles(self, guild: discord.Guild) -> Dict[str, int]:
+        """The emoji -> role id map of guilds without configured reaction roles:
+        the special roles, and every role by its name.
+        Built from the roles of the guild once and cached until a role changes"""
+        emoji_roles = self.default_emoji_roles.get(guild.id)
+        if emoji_roles is None:
+            by_name = {role.name: role.id for role in guild.roles}
+            emoji_roles = dict(by_name)
+            for emoji, role_name in self.special_roles.items():
+                if role_name in by_name:
+                    emoji_roles[emoji] = by_name[role_name]
+            self.default_emoji_roles[guild.id] = emoji_roles
+        return emoji_roles
+
     async def add_role_from_payload(self, *, payload: RawReactionActionEvent, role: discord.Role, channel: MessageChannel):
         try:
             if role in payload.member.roles:
@@ -63,43 +132,59 @@ class ReactionRoles(BaseCog):
                 pass
 
     async def remove_reaction(self, *, payload: RawReactionActionEvent, channel: MessageChannel):
-        messages = await channel.history(limit=10).flatten()
-        message: discord.Message = discord.utils.get(
-            messages, id=payload.message_id
-        )
+        # A partial message needs no fetch, and works for messages of any age.
+        message: discord.PartialMessage = channel.get_partial_message(payload.message_id)
 
-        if not any([r.me for r in message.reactions if r.emoji == payload.emoji]):
+        # Makes sure the reaction of the bot stays, such that the emoji does not disappear.
+        # Only once per message and emoji, adding an existing reaction is a no-op for discord.
+        key = (payload.message_id, str(payload.emoji))
+        if key not in self.ensured_reactions:
             await message.add_reaction(payload.emoji)
+            self.ensured_reactions.add(key)
         await message.remove_reaction(payload.emoji, payload.member)
 
     @commands.Cog.listener()
+    @timed_listener
     async def on_raw_reaction_add(self, payload: RawReactionActionEvent):
         if payload.user_id == self.bot.user.id:
             return
 
-        try:
-            role_name: str = self.special_roles[payload.emoji.name]
-        except KeyError:
-            role_name: str = payload.emoji.name
+        settings = await ServerSettings.get_settings(payload.guild_id)
+        if settings is None or payload.channel_id != settings.role_channel:
+            return
 
-        guild: discord.Guild = discord.utils.get(
-            self.bot.guilds, id=payload.guild_id)
-        role: discord.Role = discord.utils.get(guild.roles, name=role_name)
-        if role is None:
+        guild: Optional[discord.Guild] = self.bot.get_guild(payload.guild_id)
+        if guild is None:
             return
 
-        settings = ServerSettings.query.find(
-            {"server_id": payload.guild_id}).first()
-        if str(payload.channel_id) != str(settings.role_channel):
+        emoji_roles = await ServerSettings.get_emoji_roles(payload.guild_id)
+        if not emoji_roles:
+            emoji_roles = self.get_default_emoji_roles(guild)
+        role_id = emoji_roles.get(payload.emoji.name)
+        role: Optional[discord.Role] = guild.get_role(role_id) if role_id is not None else None
+        if role is None:
             return
 
-        channel: MessageChannel = discord.utils.get(
-            guild.channels, id=payload.channel_id
-        )
+        channel: MessageChannel = guild.get_channel(payload.channel_id)
 
         await self.add_role_from_payload(payload=payload, role=role, channel=channel)
         await self.remove_reaction(payload=payload, channel=channel)
 
+    @commands.Cog.listener()
+    @timed_listener
+    async def on_guild_role_create(self, role: discord.Role):
+        self.default_emoji_roles.pop(role.guild.id, None)
+
+    @commands.Cog.listener()
+    @timed_listener
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role):
+        self.default_emoji_roles.pop(after.guild.id, None)
+
+    @commands.Cog.listener()
+    @timed_listener
+    async def on_guild_role_delete(self, role: discord.Role):
+        self.default_emoji_roles.pop(role.guild.id, None)
+
     def cog_unload(self):
         logging.info("Cog Role Select unloaded")
 
@@ -1,5 +1,6 @@
 import asyncio
 import logging
+from typing import Dict, List
 
 import discord
 from discord import Permissions
@@ -8,9 +9,25 @@ from discord.commands import SlashCommandGroup, Option
 
 from database.server import ServerSettings
 from models import MainTextChannel, ModelACTX, ModelCCTX, create_main_text_channel
-from resources import create_welcome_embed, create_welcome_view
+from resources import create_welcome_embed, create_burst_welcome_embed, create_welcome_view
+from utils import MessageChannel, WindowBatcher, channel_send_queue, chunked, timed_listener
 from .base import BaseCog
 
+# Keeps the description of a burst welcome embed well below the 4096 character limit
+BURST_MENTIONS_PER_EMBED = 50
+
+
+class WelcomeTemplate:
+    """The parts of the welcome message of a guild that are the same for every member:
+    the resolved channel to send in, the header and the link button view.
+    The view only holds link buttons, so a single instance can be sent any amount of times."""
+    __slots__ = ("channel", "header_text", "view")
+
+    def __init__(self, *, channel: MessageChannel, header_text: str, view: discord.ui.View):
+        self.channel = channel
+        self.header_text = header_text
+        self.view = view
+
 
 class ServerManager(BaseCog):
     server = SlashCommandGroup(
@@ -28,6 +45,10 @@ class ServerManager(BaseCog):
 
     def __init__(self, bot):
         self.bot = bot
+        # guild id -> compiled welcome template, see get_welcome_template
+        self.welcome_templates: Dict[int, WelcomeTemplate] = {}
+        # Collects the joins per guild in burst mode
+        self.welcome_batcher = WindowBatcher(self.run_burst_welcome_message)
 
     @server.command(
         name="settings",
@@ -41,14 +62,26 @@ class ServerManager(BaseCog):
                 description="The setting you want to set",
                 choices=[
                     "save_settings_on_leave",
-                    "run_welcome_message"
+                    "run_welcome_message",
+                    "burst_mode"
                 ]
             ),
             value: Option(bool)
     ):
-        ServerSettings.change_setting(ctx.guild.id, str(setting), bool(value))
+        await ServerSettings.change_setting(ctx.guild.id, str(setting), bool(value))
         await ctx.respond(f"changed `{setting}` to `{value}`", ephemeral=True)
 
+    @server.command(
+        name="burst_window",
+        description="set for how many seconds joins are collected in burst mode")
+    async def burst_window(
+            self,
+            ctx: discord.ApplicationContext,
+            seconds: Option(int, min_value=1, max_value=300)
+    ):
+        await ServerSettings.change_setting(ctx.guild.id, "burst_window", int(seconds))
+        await ctx.respond(f"changed `burst_window` to `{seconds}` seconds", ephemeral=True)
+
     @welcome.command(
         name="channels",
         description="set the channels for your welcome messge."
@@ -75,8 +108,9 @@ class ServerManager(BaseCog):
     ):
         setting_name = f"{channel_type}_channel"
         channel = await MainTextChannel.from_mention(channel_mention, context=ModelACTX(ctx))
-        ServerSettings.change_setting(ctx.guild.id, setting_name, int(
+        await ServerSettings.change_setting(ctx.guild.id, setting_name, int(
             channel.discord.id), group="welcome")
+        self.welcome_templates.pop(ctx.guild.id, None)
         await ctx.respond(
             f"changed the `{channel_type}` channel to {channel.discord.mention}",
             ephemeral=True
@@ -102,8 +136,9 @@ class ServerManager(BaseCog):
             text: Option(str)
     ):
         setting_name = f"{setting}_text"
-        ServerSettings.change_setting(
+        await ServerSettings.change_setting(
             ctx.guild.id, setting_name, str(text), group="welcome")
+        self.welcome_templates.pop(ctx.guild.id, None)
         await ctx.respond(f"changed `{setting}` text to `{text}`", ephemeral=True)
 
     @server.command(
@@ -114,20 +149,24 @@ class ServerManager(BaseCog):
             ctx: discord.ApplicationContext
     ):
         await ctx.respond(
-            str(ServerSettings.query.find(
-                {"server_id": ctx.guild.id}).first()),
+            str(await ServerSettings.get_settings(ctx.guild.id)),
             ephemeral=True
         )
 
-    async def run_welcome_message(self, settings: ServerSettings, member: discord.Member):
+    async def get_welcome_template(self, settings: ServerSettings, guild: discord.Guild) -> WelcomeTemplate:
+        """The welcome template of the guild, compiled on first use and cached until the welcome settings change"""
+        template = self.welcome_templates.get(guild.id)
+        if template is not None:
+            return template
+
         init_context = ModelCCTX(
-            channel=member.guild.system_channel, bot=self.bot)
+            channel=guild.system_channel, bot=self.bot)
         channel = await create_main_text_channel(
             discord_id=settings.welcome.main_channel,
             context=init_context)
 
-        if channel.discord.guild.id != member.guild.id:
-            init_context.exit(
+        if channel.discord.guild.id != guild.id:
+            await init_context.exit(
                 f"Cannot send welcome message in {channel}, as it is not in the same guild.")
 
         main_context = ModelCCTX(channel=channel.discord, bot=self.bot)
@@ -142,12 +181,6 @@ class ServerManager(BaseCog):
             discord_id=settings.welcome.guide_button_channel,
             context=main_context)
 
-        embed: discord.Embed = create_welcome_embed(
-            title=settings.welcome.header_text,
-            member_join=member.created_at.strftime(self.bot.date_format),
-            member_avatar=str(member.display_avatar),
-            member_name=str(member.mention)
-        )
         view: discord.ui.View = create_welcome_view(
             rules_link=rules_channel.discord.jump_url,
             rules_message=settings.welcome.rules_button_text,
@@ -156,28 +189,77 @@ class ServerManager(BaseCog):
             guide_link=guide_channel.discord.jump_url,
             guide_message=settings.welcome.guide_button_text
         )
-        await channel.discord.send(embed=embed, view=view)
+        template = WelcomeTemplate(
+            channel=channel.discord,
+            header_text=settings.welcome.header_text,
+            view=view
+        )
+        self.welcome_templates[guild.id] = template
+        return template
+
+    async def run_welcome_message(self, settings: ServerSettings, member: discord.Member):
+        template = await self.get_welcome_template(settings, member.guild)
+        embed: discord.Embed = create_welcome_embed(
+            title=template.header_text,
+            member_join=member.created_at.strftime(self.bot.date_format),
+            member_avatar=str(member.display_avatar),
+            member_name=str(member.mention)
+        )
+        channel_send_queue.send(template.channel, embed=embed, view=template.view)
+
+    async def run_burst_welcome_message(self, guild_id: int, members: List[discord.Member]):
+        """Welcomes all members that joined within the burst window, with one embed per BURST_MENTIONS_PER_EMBED members"""
+        settings = await ServerSettings.get_settings(guild_id)
+        guild = self.bot.get_guild(guild_id)
+        if settings is None or guild is None:
+            return
+
+        template = await self.get_welcome_template(settings, guild)
+        for batch in chunked(members, BURST_MENTIONS_PER_EMBED):
+            embed: discord.Embed = create_burst_welcome_embed(
+                title=template.header_text,
+                member_names=[member.mention for member in batch]
+            )
+            channel_send_queue.send(template.channel, embed=embed, view=template.view)
 
     @commands.Cog.listener()
+    @timed_listener
     async def on_member_join(self, member: discord.Member):
         if member.bot is True:
             return
-        settings = ServerSettings.query.find(
-            {"server_id": member.guild.id}).first()
-        if settings.run_welcome_message:
+        settings = await ServerSettings.get_settings(member.guild.id)
+        if settings is None or not settings.run_welcome_message:
+            return
+        if settings.burst_mode:
+            self.welcome_batcher.add(member.guild.id, member, window=settings.burst_window)
+        else:
             await self.run_welcome_message(settings, member)
 
     @commands.Cog.listener()
+    @timed_listener
+    async def on_ready(self):
+        await ServerSettings.load_settings([guild.id for guild in self.bot.guilds])
+
+    @commands.Cog.listener()
+    @timed_listener
     async def on_guild_join(self, guild: discord.Guild):
-        ServerSettings.enter_server(
+        await ServerSettings.enter_server(
             guild.id,
             channel_id=guild.system_channel.id,
             welcome_message=f"Welcome to {guild.name}!"
         )
 
     @commands.Cog.listener()
+    @timed_listener
     async def on_guild_remove(self, guild: discord.Guild):
-        ServerSettings.leave_server(guild.id)
+        await ServerSettings.leave_server(guild.id)
+        self.welcome_templates.pop(guild.id, None)
+
+    @commands.Cog.listener()
+    @timed_listener
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel):
+        # The template might link to or send in the deleted channel, it is recompiled on the next join.
+        self.welcome_templates.pop(channel.guild.id, None)
 
     def cog_unload(self):
         logging.info("Cog Server Management Unloaded")
@@ -1,14 +1,25 @@
-from ming import create_datastore
-from ming.odm import ThreadLocalODMSession
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from ming import create_datastore, mim
+from ming.odm import ThreadLocalODMSession, Mapper
 from ming.datastore import DataStore
 
 from pymongo import MongoClient
 from pymongo.database import Database
 
-from beartype import beartype
-from beartype.typing import Optional
+from beartype.typing import Optional, Callable, Any, Iterator
 
-from utils import classproperty
+from utils import classproperty, typechecked
+from utils.metrics import metrics
+
+
+# The executor the database calls of the current task run on, set by DBManager.background
+_current_executor: ContextVar[Optional[ThreadPoolExecutor]] = ContextVar("database_executor", default=None)
 
 
 class DatabaseConnectionError(Exception):
@@ -32,36 +43,47 @@ class DBManager:
     - db: the PyMongo Database object
         - db.client: the PyMongo MongoClient object
         - db.name: the name of the database the Ming uri made the DataStore connect to.
+    - executor: the bounded ThreadPoolExecutor all blocking database calls are run on, see DBManager.run
+    - job_executor: the separate ThreadPoolExecutor of the heavy scheduled jobs, see DBManager.background
 
     Raises DatabaseConnectionError if the database is either connected to multiple times or not at all
-    Raises FaultyDatabase if the database object is not initialised to get the expected attributes"""
+    Raises FaultyDatabase if the database object is not initialised to get the expected attributes
+    Besides MongoDB, the in-memory Ming datastore (mim://) is accepted, for benchmarks and offline use."""
 
     def __new__(cls, *args, **kwargs):
         if not hasattr(cls, "_instance"):
             cls._instance = super().__new__(cls)
         return cls._instance
 
-    @beartype
-    def __init__(self, *, uri: Optional[str] = None):
+    @typechecked
+    def __init__(self, *, uri: Optional[str] = None, max_workers: int = 4, job_workers: int = 1):
         cls = self.__class__
         if uri:
             if hasattr(cls, "_uri"):
                 raise DatabaseConnectionError
             cls._uri: str = uri
             cls.sessions: dict = {}
+            cls.executor: ThreadPoolExecutor = ThreadPoolExecutor(
+                max_workers=max_workers,
+                thread_name_prefix="database"
+            )
+            cls.job_executor: ThreadPoolExecutor = ThreadPoolExecutor(
+                max_workers=job_workers,
+                thread_name_prefix="database-jobs"
+            )
 
             cls.datastore: DataStore = create_datastore(uri)
             # If it looks like a duck and quacks like a duck, it might still trow an error
-            if not isinstance(cls.datastore.db, Database):
+            if not isinstance(cls.datastore.db, (Database, mim.Database)):
                 raise FaultyDatabase
-            if not isinstance(cls.datastore.db.client, MongoClient):
+            if not isinstance(cls.datastore.db.client, (MongoClient, mim.Connection)):
                 raise FaultyDatabase
 
         if not hasattr(cls, "_uri"):
             raise DatabaseConnectionError
 
     @classproperty
-    @beartype
+    @typechecked
     def db(cls):
         """The underling Database from PyMongo
         Has the attribures:
@@ -71,9 +93,93 @@ class DBManager:
         return db
 
     @classmethod
-    @beartype
+    @typechecked
     def add_session(cls, name: str):
         """adds a ming ThreadLocalODMSession to the .sessions dict, and returns it."""
         cls.sessions[name]: ThreadLocalODMSession = ThreadLocalODMSession(
             bind=cls.datastore)
         return cls.sessions[name]
+
+    @classmethod
+    def compile_mappers(cls):
+        """Compiles the mappers of all mapped classes in a single step, to be called once all of them are imported.
+        Mapped classes cannot be used before this is done."""
+        Mapper.compile_all()
+
+    @classmethod
+    async def ensure_indexes(cls):
+        """Creates the indexes declared in the __mongometa__ of all mapped classes, if they don't exist yet."""
+        await cls.run(Mapper.ensure_all_indexes)
+
+    @classmethod
+    @contextmanager
+    def background(cls) -> Iterator[None]:
+        """Runs the database calls made by the current task within the block on the job_executor,
+        such that heavy scheduled jobs never take the executor threads the commands and events need."""
+        token = _current_executor.set(cls.job_executor)
+        try:
+            yield
+        finally:
+            _current_executor.reset(token)
+
+    @classmethod
+    async def run(cls, func: Callable, *args, **kwargs) -> Any:
+        """Runs the blocking (database) function on the executor as a unit of work, and awaits the result.
+        Within DBManager.background, the job_executor is used instead.
+        This keeps slow Mongo round trips from stalling the event loop.
+        The duration is recorded per collection and operation, classmethods of mapped classes are labeled with their collection."""
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        try:
+            return await loop.run_in_executor(
+                _current_executor.get() or cls.executor,
+                functools.partial(cls._run_blocking, loop, func, *args, **kwargs)
+            )
+        finally:
+            mongometa = getattr(args[0], "__mongometa__", None) if args else None
+            metrics.observe(
+                "database_call_seconds",
+                time.perf_counter() - start,
+                collection=getattr(mongometa, "name", "none"),
+                operation=func.__name__
+            )
+
+    @classmethod
+    def _run_blocking(cls, loop: asyncio.AbstractEventLoop, func: Callable, *args, **kwargs) -> Any:
+        """The unit of work every database call runs in: all changes are flushed once when func returns,
+        and the sessions are cleared afterwards, also if func raised.
+        Commands, events and scheduled jobs only reach the sessions through DBManager.run,
+        so the identity maps never outlive a single call, and a flush only walks what that call loaded.
+
+        The ming sessions are thread local, and never refresh documents already in their identity map.
+        Clearing them also makes sure no executor thread serves documents another thread changed."""
+        try:
+            result = func(*args, **kwargs)
+            flush_start = time.perf_counter()
+            for session in cls.sessions.values():
+                session.flush()
+            loop.call_soon_threadsafe(functools.partial(
+                metrics.observe, "database_flush_seconds", time.perf_counter() - flush_start))
+            return result
+        finally:
+            for name, session in cls.sessions.items():
+                size = len(session._get().imap._objects)
+                if size:
+                    loop.call_soon_threadsafe(functools.partial(
+                        metrics.observe, "database_session_objects", size, collection=name))
+                session.clear()
+
+
+class asyncclassmethod:
+    """Decorator that effectivly combines the @classmethod decorator with DBManager.run
+    Calling the method returns an awaitable, the blocking body itself runs on the database executor.
+    The blocking version stays accessible as method.blocking, to be used by other methods already running on the executor."""
+
+    @typechecked
+    def __init__(self, func: Callable):
+        self.func = func
+
+    def __get__(self, owner_self: Any, owner_cls: type):
+        method = functools.partial(DBManager.run, self.func, owner_cls)
+        method.blocking = functools.partial(self.func, owner_cls)
+        return method
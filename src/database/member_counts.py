@@ -0,0 +1,56 @@
+from collections import Counter
+from typing import List, Set
+
+from pymongo.collection import Collection
+
+from utils import classproperty, chunked
+from .connect import DBManager, asyncclassmethod
+
+# The maximum amount of member ids in a single staging document, keeps documents far below the 16MB limit
+STAGING_CHUNK_SIZE = 50000
+
+
+class MemberCountStaging:
+    """Staging collection of the nightly reference count reconciliation, when the shards are spread over multiple processes.
+    Every process stages the member ids of the guilds of its own shards under the id of the run,
+    the process running shard 0 aggregates them once every shard has been staged.
+    Not a mapped class, the documents are only ever written and read in bulk."""
+
+    class __mongometa__:
+        name = "member_count_staging"
+
+    @classproperty
+    def collection(cls) -> Collection:
+        return DBManager.db[cls.__mongometa__.name]
+
+    @asyncclassmethod
+    def stage(cls, run: str, shard_id: int, member_ids: List[int]):
+        """(Re)places the member ids of the shard, an id occurs once for every guild of the shard the user is in"""
+        cls.collection.create_index([("run", 1), ("shard", 1)])
+        cls.collection.delete_many({"run": run, "shard": shard_id})
+        # Always at least one document, such that a shard without members also counts as staged
+        batches = list(chunked(member_ids, STAGING_CHUNK_SIZE)) or [[]]
+        cls.collection.insert_many([
+            {"run": run, "shard": shard_id, "member_ids": batch}
+            for batch in batches
+        ])
+
+    @asyncclassmethod
+    def staged_shards(cls, run: str) -> Set[int]:
+        return {
+            document["shard"]
+            for document in cls.collection.find({"run": run}, projection=["shard"])
+        }
+
+    @asyncclassmethod
+    def load(cls, run: str) -> Counter:
+        """The amount of guilds every user is in, over all shards"""
+        member_counts: Counter = Counter()
+        for document in cls.collection.find({"run": run}, projection=["member_ids"]):
+            member_counts.update(document["member_ids"])
+        return member_counts
+
+    @asyncclassmethod
+    def clear(cls, run: str):
+        """Removes the staged member ids of the run, and of any earlier run that never completed"""
+        cls.collection.delete_many({"run": {"$lte": run}})
@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Tuple
+
+from bson.objectid import ObjectId
+from pymongo.collection import Collection
+
+from utils import classproperty
+from .connect import DBManager, asyncclassmethod
+
+
+class NotificationOutbox:
+    """Persistent queue of the notification DMs, sent in the background by the NotificationWorker.
+    A notification is available once available_at has passed. Claiming moves available_at forward by the lease,
+    such that the notifications of a worker that stopped half way become available again.
+    Not a mapped class, the documents are only ever written and read in bulk."""
+
+    class __mongometa__:
+        name = "notification_outbox"
+
+    @classproperty
+    def collection(cls) -> Collection:
+        return DBManager.db[cls.__mongometa__.name]
+
+    @asyncclassmethod
+    def ensure_indexes(cls):
+        cls.collection.create_index([("available_at", 1)])
+        cls.collection.create_index([("discord_id", 1)])
+
+    @asyncclassmethod
+    def enqueue(cls, discord_id: int, message: str):
+        cls.collection.insert_one(cls._new_document(discord_id, message, now=datetime.utcnow()))
+
+    @asyncclassmethod
+    def enqueue_many(cls, notifications: List[Tuple[int, str]]):
+        """Queues the (discord_id, message) pairs in a single insert"""
+        if not notifications:
+            return
+        now = datetime.utcnow()
+        cls.collection.insert_many([
+            cls._new_document(discord_id, message, now=now)
+            for discord_id, message in notifications
+        ])
+
+    @staticmethod
+    def _new_document(discord_id: int, message: str, *, now: datetime) -> Dict[str, Any]:
+        return {
+            "discord_id": discord_id,
+            "message": message,
+            "created": now,
+            "available_at": now,
+            "attempts": 0,
+        }
+
+    @asyncclassmethod
+    def claim(cls, *, limit: int, lease: timedelta) -> Dict[int, List[Dict[str, Any]]]:
+        """Claims the available notifications of up to limit users, oldest first.
+        Every available notification of such a user is claimed, such that they can be sent together.
+        Returns the claimed notifications per discord_id, oldest first."""
+        now = datetime.utcnow()
+        available = cls.collection.find(
+            {"available_at": {"$lte": now}}, projection=["discord_id"]
+        ).sort("available_at", 1).limit(limit)
+        discord_ids = list(dict.fromkeys(notification["discord_id"] for notification in available))
+        if not discord_ids:
+            return {}
+
+        # The claim id tells apart the notifications claimed here from those claimed by another worker
+        claim = ObjectId()
+        cls.collection.update_many(
+            {"discord_id": {"$in": discord_ids}, "available_at": {"$lte": now}},
+            {"$set": {"available_at": now + lease, "claim": claim}}
+        )
+        claimed: Dict[int, List[Dict[str, Any]]] = {}
+        for notification in cls.collection.find({"claim": claim}).sort("created", 1):
+            claimed.setdefault(notification["discord_id"], []).append(notification)
+        return claimed
+
+    @asyncclassmethod
+    def complete(cls, notification_ids: List[ObjectId]):
+        """Removes the notifications, once sent or given up on"""
+        cls.collection.delete_many({"_id": {"$in": notification_ids}})
+
+    @asyncclassmethod
+    def retry(cls, notification_ids: List[ObjectId], *, delay: timedelta):
+        """Makes the claimed notifications available again after delay"""
+        cls.collection.update_many(
+            {"_id": {"$in": notification_ids}},
+            {"$set": {"available_at": datetime.utcnow() + delay, "claim": None}, "$inc": {"attempts": 1}}
+        )
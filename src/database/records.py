@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from typing import Any, Dict, FrozenSet, Iterable, List, Mapping, Optional, Type, TypeVar
+
+from pymongo.collection import Collection
+
+R = TypeVar("R", bound="Record")
+
+
+class Record:
+    """Base class of the lean read API: a plain, read-only record of a projected document.
+    Unlike MappedClass instances, records are not tracked by an ODM session and skip Ming's schema validation.
+
+    Subclasses list the fields they read in __slots__, only those fields are fetched.
+    Fields missing from the document get the value from defaults, or None.
+    Fields in nested are sub documents, converted into the given Record subclass.
+    Missing sub documents become a record of defaults, unless the field is in optional, then it stays None."""
+    __slots__ = ()
+    defaults: Dict[str, Any] = {}
+    nested: Dict[str, Type[Record]] = {}
+    optional: FrozenSet[str] = frozenset()
+
+    @classmethod
+    def projection(cls) -> List[str]:
+        return list(cls.__slots__)
+
+    @classmethod
+    def from_document(cls: Type[R], document: Mapping[str, Any]) -> R:
+        record = cls.__new__(cls)
+        for field in cls.__slots__:
+            value = document.get(field)
+            if value is None:
+                value = cls.defaults.get(field)
+            if field in cls.nested and not (value is None and field in cls.optional):
+                value = cls.nested[field].from_document(value or {})
+            object.__setattr__(record, field, value)
+        return record
+
+    @classmethod
+    def find_one(cls: Type[R], collection: Collection, query: Dict[str, Any]) -> Optional[R]:
+        document = collection.find_one(query, projection=cls.projection())
+        return None if document is None else cls.from_document(document)
+
+    @classmethod
+    def find(cls: Type[R], collection: Collection, query: Dict[str, Any]) -> List[R]:
+        return cls.from_documents(collection.find(query, projection=cls.projection()))
+
+    @classmethod
+    def from_documents(cls: Type[R], documents: Iterable[Mapping[str, Any]]) -> List[R]:
+        return [cls.from_document(document) for document in documents]
+
+    def __setattr__(self, name: str, value: Any):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{field}={getattr(self, field)!r}" for field in self.__slots__)
+        return f"{type(self).__name__}({fields})"
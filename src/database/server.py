@@ -1,12 +1,35 @@
-from typing import Any, Optional
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional
 
 from ming import schema as s
 from ming.odm import FieldProperty
 from ming.odm.declarative import MappedClass
-from ming.odm import Mapper
 
 from utils import classproperty
-from .connect import DBManager
+from .connect import DBManager, asyncclassmethod
+
+
+# Write-through cache of the settings per server_id, kept up to date by the ServerSettings classmethods.
+# Settings only change through those, so event listeners never have to query the database.
+_settings_cache: Dict[int, Optional[ServerSettings]] = {}
+# The reaction_roles setting of every cached server, compiled to a plain dict of emoji name -> role id.
+_emoji_roles_cache: Dict[int, Dict[str, int]] = {}
+
+
+def _cache_settings(server_id: int, settings: Optional[ServerSettings]):
+    _settings_cache[server_id] = settings
+    if settings is None or not settings.reaction_roles:
+        _emoji_roles_cache[server_id] = {}
+    else:
+        _emoji_roles_cache[server_id] = {
+            emoji: int(role_id) for emoji, role_id in settings.reaction_roles.items()
+        }
+
+
+def _uncache_settings(server_id: int):
+    _settings_cache.pop(server_id, None)
+    _emoji_roles_cache.pop(server_id, None)
 
 
 class ServerSettings(MappedClass):
@@ -26,6 +49,15 @@ class ServerSettings(MappedClass):
 
     role_channel = FieldProperty(s.Int)
 
+    # Burst mode: joins are collected for burst_window seconds, then welcomed and registered together
+    burst_mode = FieldProperty(s.Bool(
+        if_missing=False))
+    burst_window = FieldProperty(s.Int(
+        if_missing=10))
+
+    # emoji name -> role id, for role-select
+    reaction_roles = FieldProperty(s.Object({str: s.Int}, if_missing={}))
+
     # Initialising with the data from Lucifer's Lockup Lobby to give a valid starting point.
     welcome = FieldProperty(s.Object({
         "header_text": s.String(
@@ -55,8 +87,14 @@ class ServerSettings(MappedClass):
             f"server_id = '{self.server_id}'",
             f"save_settings_on_leave = '{self.save_settings_on_leave}'",
             f"run_welcome_message = '{self.run_welcome_message}'",
-            f"role_channel = '{self.role_channel}'"
+            f"role_channel = '{self.role_channel}'",
+            f"burst_mode = '{self.burst_mode}'",
+            f"burst_window = '{self.burst_window}'"
         ])
+        reaction_roles = "\n".join(
+            [f"== Reaction Roles =="] + [
+                f"{emoji} = '{role_id}'" for emoji, role_id in (self.reaction_roles or {}).items()
+            ])
         welcome = "\n".join([
             f"== Welcome Message ==",
             f"header_text = '{self.welcome.header_text}'",
@@ -70,10 +108,38 @@ class ServerSettings(MappedClass):
         ])
         return "\n\n".join([
             main,
-            welcome
+            welcome,
+            reaction_roles
         ])
 
     @classmethod
+    async def get_settings(cls, server_id: int) -> Optional[ServerSettings]:
+        """Returns the settings document of the server, or None if there is none
+        Served from the settings cache, only loads from the database on a cache miss."""
+        if server_id not in _settings_cache:
+            await cls.load_settings([server_id])
+        return _settings_cache.get(server_id)
+
+    @classmethod
+    async def get_emoji_roles(cls, server_id: int) -> Dict[str, int]:
+        """Returns the configured emoji name -> role id mapping of the server, empty if there is none
+        Served from the settings cache, only loads from the database on a cache miss."""
+        if server_id not in _emoji_roles_cache:
+            await cls.load_settings([server_id])
+        return _emoji_roles_cache.get(server_id, {})
+
+    @asyncclassmethod
+    def load_settings(cls, server_ids: List[int]):
+        """(Re)loads the settings of all the servers into the settings cache, in a single query.
+        Servers without settings are cached as None, such that they don't query the database either."""
+        found = {
+            settings.server_id: settings
+            for settings in cls.query.find({"server_id": {"$in": server_ids}}).all()
+        }
+        for server_id in server_ids:
+            _cache_settings(server_id, found.get(server_id))
+
+    @asyncclassmethod
     def enter_server(
         cls,
         server_id: int,
@@ -81,8 +147,9 @@ class ServerSettings(MappedClass):
         channel_id: int = 0,
         welcome_message: str = "Welcome to the server!"
     ):
-        if not cls.query.find({"server_id": server_id}).count():
-            cls(
+        settings = cls.query.find({"server_id": server_id}).first()
+        if settings is None:
+            settings = cls(
                 server_id=server_id,
                 welcome={
                     "main_channel": channel_id,
@@ -90,15 +157,17 @@ class ServerSettings(MappedClass):
                 }
             )
             DBManager.sessions[cls.name].flush()
+        _cache_settings(server_id, settings)
 
-    @classmethod
+    @asyncclassmethod
     def leave_server(cls, server_id: int):
         cls.query.remove({
             "server_id": server_id,
             "save_settings_on_leave": False
         })
+        _uncache_settings(server_id)
 
-    @classmethod
+    @asyncclassmethod
     def change_setting(
         cls,
         server_id: int,
@@ -109,7 +178,7 @@ class ServerSettings(MappedClass):
     ):
         data = cls.query.find({"server_id": server_id})
         if not data.count():
-            cls.enter_server(server_id)
+            cls.enter_server.blocking(server_id)
 
         settings = data.first()
         if group is not None:
@@ -117,6 +186,21 @@ class ServerSettings(MappedClass):
         else:
             settings[setting] = value
         DBManager.sessions[cls.name].flush()
-
-
-Mapper.compile_all()
+        _cache_settings(server_id, settings)
+
+    @asyncclassmethod
+    def set_reaction_role(cls, server_id: int, emoji: str, role_id: Optional[int]):
+        """Maps the emoji name to the role for role-select, or removes the mapping of the emoji if role_id is None"""
+        settings = cls.query.find({"server_id": server_id}).first()
+        if settings is None:
+            cls.enter_server.blocking(server_id)
+            settings = _settings_cache[server_id]
+
+        reaction_roles = dict(settings.reaction_roles or {})
+        if role_id is None:
+            reaction_roles.pop(emoji, None)
+        else:
+            reaction_roles[emoji] = role_id
+        settings.reaction_roles = reaction_roles
+        DBManager.sessions[cls.name].flush()
+        _cache_settings(server_id, settings)
@@ -2,7 +2,6 @@ from ming import schema as s
 from ming.odm import FieldProperty
 from ming.odm.property import ForeignIdProperty, RelationProperty
 from ming.odm.declarative import MappedClass
-from ming.odm import Mapper
 
 from utils import classproperty
 from .connect import DBManager
@@ -46,6 +45,3 @@ class Tasks(MappedClass):
     @classproperty
     def name(cls):
         return cls.__mongometa__.name
-
-
-Mapper.compile_all()
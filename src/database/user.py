@@ -1,20 +1,32 @@
 from __future__ import annotations
 
-from typing import Any, List, Optional
+import asyncio
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from collections import Counter
 from datetime import datetime, timedelta, timezone
 
 from ming import schema as s
 from ming.odm import FieldProperty
 from ming.odm.property import ForeignIdProperty, RelationProperty
 from ming.odm.declarative import MappedClass
-from ming.odm import Mapper
+from ming.odm import mapper
 from bson.objectid import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.collection import Collection
 
-from utils import classproperty
-from .connect import DBManager
+from utils import classproperty, chunked, scheduled_job
+from .connect import DBManager, asyncclassmethod
+from .member_counts import MemberCountStaging
+from .records import Record
 from .tasks import TaskTags, Tasks
 
 
+# The maximum amount of operations send to the database in a single bulk operation
+BULK_BATCH_SIZE = 1000
+
+
 class UserAlreadyRegisterd(Exception):
     pass
 
@@ -24,16 +36,226 @@ class UserNotRegisterd(Exception):
 
 
 class RefCountUpdater:
-    """Callable used for the scheduler to be able to access the reference count updater."""
+    """Callable used for the scheduler to be able to access the reference count updater.
+    Shard aware: if this process does not run every shard, the member ids of its own shards are staged in MongoDB,
+    and the process running shard 0 reconciles once every shard has been staged."""
 
-    def __init__(self, *, bot=None):
+    def __init__(self, *, bot=None, reconcile_timeout: float = 900, poll_interval: float = 15):
         self.bot = bot
+        self.reconcile_timeout = reconcile_timeout
+        self.poll_interval = poll_interval
+
+    async def __call__(self) -> int:
+        """Returns the amount of users updated or deleted"""
+        shard_count: int = getattr(self.bot, "shard_count", None) or 1
+        shard_ids: List[int] = getattr(self.bot, "shard_ids", None) or list(range(shard_count))
+
+        # Write the pending activity first, such that no recently active user gets deleted
+        await last_active_tracker.flush()
 
-    def __call__(self):
-        user_ids = []
+        if len(shard_ids) >= shard_count:
+            member_counts: Counter[int] = Counter(
+                member.id for guild in self.bot.guilds for member in guild.members)
+        else:
+            member_counts = await self.reconcile_shards(shard_ids, shard_count)
+
+        touched = 0
+        if member_counts is not None:
+            touched = await DBUser.update_database(member_counts, delete_time=self.bot.user_delete_time)
+        # Users might have been deleted, they have to be registered again on their next command
+        last_active_tracker.forget_all()
+        return touched
+
+    async def reconcile_shards(self, shard_ids: List[int], shard_count: int) -> Optional[Counter[int]]:
+        """Stages the member ids of the shards of this process.
+        Returns the member counts over all shards in the process running shard 0, and None in every other process,
+        or if not every shard was staged within reconcile_timeout seconds."""
+        run = datetime.utcnow().strftime("%Y-%m-%d")
+        member_ids: Dict[int, List[int]] = {shard_id: [] for shard_id in shard_ids}
         for guild in self.bot.guilds:
-            user_ids += [member.id for member in guild.members]
-        DBUser.update_database(user_ids, delete_time=self.bot.user_delete_time)
+            member_ids.setdefault(guild.shard_id, []).extend(
+                member.id for member in guild.members)
+        for shard_id, ids in member_ids.items():
+            await MemberCountStaging.stage(run, shard_id, ids)
+
+        if 0 not in shard_ids:
+            return None
+
+        all_shards = set(range(shard_count))
+        waited = 0.0
+        staged = await MemberCountStaging.staged_shards(run)
+        while not all_shards <= staged:
+            if waited >= self.reconcile_timeout:
+                # Never delete users based on the members of only some of the shards
+                logging.warning(
+                    f"Reference count reconciliation skipped, shards {sorted(all_shards - staged)} were not staged")
+                return None
+            await asyncio.sleep(self.poll_interval)
+            waited += self.poll_interval
+            staged = await MemberCountStaging.staged_shards(run)
+
+        member_counts = await MemberCountStaging.load(run)
+        await MemberCountStaging.clear(run)
+        return member_counts
+
+
+class DerelictSweeper:
+    """Callable used for the scheduler to periodically release every user owned by a derelict owner.
+    on_released is awaited with the (owner discord_id, owned discord_id) pairs of the released users,
+    such that the owners can be notified.
+    With multiple processes, only the process running shard 0 sweeps."""
+
+    def __init__(
+        self,
+        *,
+        bot=None,
+        on_released: Optional[Callable[[List[Tuple[int, int]]], Awaitable[None]]] = None
+    ):
+        self.bot = bot
+        self.on_released = on_released
+
+    async def __call__(self) -> int:
+        """Returns the amount of users released"""
+        shard_ids: Optional[List[int]] = getattr(self.bot, "shard_ids", None)
+        if shard_ids is not None and 0 not in shard_ids:
+            return 0
+
+        # Write the pending activity first, such that no active owner counts as derelict
+        await last_active_tracker.flush()
+        released = await DBUser.release_derelict(derelict_time=self.bot.derelict_time)
+        if released and self.on_released is not None:
+            await self.on_released(released)
+        return len(released)
+
+
+class LastActiveTracker:
+    """Collects the last_active updates of users in memory, and writes them to the database in periodic batches.
+    This keeps a database write out of every slash command.
+
+    attributes:
+    - pending: the last_active time per discord_id, that is not yet written to the database
+    - flushing: the updates that are being written right now, only one flush runs at a time
+    - known: the discord_ids known to be registered, for which a touch only has to be recorded"""
+
+    def __init__(self):
+        self.pending: Dict[int, datetime] = {}
+        self.flushing: Dict[int, datetime] = {}
+        self.known: Set[int] = set()
+        self._flush_lock = asyncio.Lock()
+        # Users are touched and forgotten from executor threads as well, while flush runs on the event loop
+        self._lock = threading.Lock()
+
+    def touch(self, discord_id: int) -> bool:
+        """Records the user as active right now.
+        Returns whether the user is known to be registered. If not, DBUser.update still has to be called."""
+        with self._lock:
+            self.pending[discord_id] = datetime.utcnow()
+            return discord_id in self.known
+
+    def remember(self, discord_id: int):
+        """Marks the user as registered"""
+        with self._lock:
+            self.known.add(discord_id)
+
+    def last_active(self, discord_id: int, *, default: datetime) -> datetime:
+        """The last_active time of the user including pending updates, default being the one from the database"""
+        with self._lock:
+            return self.pending.get(discord_id) or self.flushing.get(discord_id) or default
+
+    def forget(self, discord_id: int):
+        """Drops the user, to be called when the user is removed from the database"""
+        with self._lock:
+            self.pending.pop(discord_id, None)
+            self.known.discard(discord_id)
+
+    def forget_all(self):
+        """Drops every known user, to be called when users might have been removed from the database"""
+        with self._lock:
+            self.known = set()
+
+    async def flush(self) -> int:
+        """Writes all pending updates to the database in a single bulk operation, returns the amount of users written.
+        A flush called while another one runs waits for it, such that all activity up to the call is written once it returns.
+        If the write fails, the updates are pending again."""
+        async with self._flush_lock:
+            with self._lock:
+                if not self.pending:
+                    return 0
+                self.flushing, self.pending = self.pending, {}
+            try:
+                await DBUser.set_last_active(self.flushing)
+                return len(self.flushing)
+            except Exception:
+                # Updates recorded during the write are newer, and are kept
+                with self._lock:
+                    for discord_id, time in self.flushing.items():
+                        self.pending.setdefault(discord_id, time)
+                raise
+            finally:
+                with self._lock:
+                    self.flushing = {}
+
+
+last_active_tracker = LastActiveTracker()
+flush_last_active = scheduled_job("flush_last_active")(last_active_tracker.flush)
+
+
+class OwnershipMap:
+    """In-memory reverse index of the controller field of all users, kept in sync by the DBUser classmethods.
+    Users that control themselves are not stored.
+    Until it is loaded with DBUser.load_ownership, DBUser.get_owned falls back to querying the database.
+
+    attributes:
+    - owned: the set of owned _ids per owner _id
+    - owner: the owner _id per owned _id"""
+
+    def __init__(self):
+        self.owned: Dict[ObjectId, Set[ObjectId]] = {}
+        self.owner: Dict[ObjectId, ObjectId] = {}
+        self.loaded = False
+        # Changes are made from multiple executor threads, and consist of multiple steps
+        self._lock = threading.Lock()
+
+    def load(self, controllers: Dict[ObjectId, ObjectId]):
+        """(Re)builds the map from the controller per user _id"""
+        with self._lock:
+            self.owned, self.owner = {}, {}
+            for owned_id, owner_id in controllers.items():
+                self._set(owned_id, owner_id)
+            self.loaded = True
+
+    def set(self, owned_id: ObjectId, owner_id: ObjectId):
+        with self._lock:
+            self._set(owned_id, owner_id)
+
+    def remove(self, db_id: ObjectId):
+        """Removes the user, both as owned and as owner. Users they owned are set to own themselves."""
+        with self._lock:
+            self._set(db_id, db_id)
+            for owned_id in self.owned.pop(db_id, set()):
+                self.owner.pop(owned_id, None)
+
+    def get_owned(self, owner_id: ObjectId) -> Set[ObjectId]:
+        with self._lock:
+            return set(self.owned.get(owner_id, ()))
+
+    def owners(self) -> List[ObjectId]:
+        """The _ids of all users that own someone"""
+        with self._lock:
+            return list(self.owned)
+
+    def _set(self, owned_id: ObjectId, owner_id: ObjectId):
+        previous = self.owner.pop(owned_id, None)
+        if previous is not None:
+            self.owned[previous].discard(owned_id)
+            if not self.owned[previous]:
+                del self.owned[previous]
+        if owner_id != owned_id:
+            self.owner[owned_id] = owner_id
+            self.owned.setdefault(owner_id, set()).add(owned_id)
+
+
+ownership_map = OwnershipMap()
 
 
 class UserKinks(MappedClass):
@@ -53,11 +275,45 @@ class UserKinks(MappedClass):
         return cls.__mongometa__.name
 
 
+class SpecialStatusesRecord(Record):
+    __slots__ = ("is_denied", "is_locked", "is_censored", "cannot_scream", "cannot_swear", "cannot_unregister")
+    defaults = {field: False for field in __slots__}
+
+
+class UserRecord(Record):
+    """The fields of a DBUser that the models read, see DBUser.get_record"""
+    __slots__ = (
+        "_id", "discord_id", "join_date", "last_active", "controller", "trusts", "allow_requests",
+        "chaster_name", "limits_message", "kinks_message", "special_statuses"
+    )
+    defaults = {
+        "trusts": False,
+        "allow_requests": True,
+        "limits_message": "This user has not yet set their limits message",
+        "kinks_message": "This user has not yet set their kinks message",
+    }
+    nested = {"special_statuses": SpecialStatusesRecord}
+
+
+class OwnerRecord(Record):
+    """The fields of the controller that a profile shows"""
+    __slots__ = ("_id", "discord_id")
+
+
+class ProfileRecord(Record):
+    """A user together with its controller, see DBUser.get_profile
+    owner is None if the controller does not exist (anymore)."""
+    __slots__ = ("user", "owner")
+    nested = {"user": UserRecord, "owner": OwnerRecord}
+    optional = frozenset({"owner"})
+
+
 class DBUser(MappedClass):
     class __mongometa__:
         name = "users"
         session = DBManager.add_session(name)
         unique_indexes = [('discord_id',)]
+        indexes = [('controller',), ('last_active',), ('ref_counter',)]
 
     _id = FieldProperty(s.ObjectId)
     join_date = FieldProperty(s.DateTime(required=True))
@@ -98,7 +354,12 @@ class DBUser(MappedClass):
     def name(cls):
         return cls.__mongometa__.name
 
-    @classmethod
+    @classproperty
+    def collection(cls) -> Collection:
+        """The underlying PyMongo Collection, for bulk operations that bypass the ODM session"""
+        return DBManager.db[cls.name]
+
+    @asyncclassmethod
     def get_user(
         cls,
         *,
@@ -107,23 +368,82 @@ class DBUser(MappedClass):
         as_user: Optional[int] = None
     ) -> DBUser:
         """Returns the document of the asociated user.
+        If as_user is provided, the user is treated as not registered if they blocked as_user.
         Raises ValueError if neither discord_id nor db_id is provided"""
+        user = cls.query.find(cls._user_query(discord_id, db_id, as_user)).first()
+        if user is None:
+            raise UserNotRegisterd
+
+        return user
+
+    @asyncclassmethod
+    def get_record(
+        cls,
+        *,
+        discord_id: Optional[int] = None,
+        db_id: Optional[ObjectId] = None,
+        as_user: Optional[int] = None
+    ) -> UserRecord:
+        """get_user for read only use: returns a UserRecord, not tracked by the ODM session."""
+        user = UserRecord.find_one(cls.collection, cls._user_query(discord_id, db_id, as_user))
+        if user is None:
+            raise UserNotRegisterd
+
+        return user
+
+    @asyncclassmethod
+    def get_profile(
+        cls,
+        *,
+        discord_id: Optional[int] = None,
+        db_id: Optional[ObjectId] = None,
+        as_user: Optional[int] = None
+    ) -> ProfileRecord:
+        """get_record together with the record of the controller, in a single aggregation (one round trip)."""
+        pipeline = [
+            {"$match": cls._user_query(discord_id, db_id, as_user)},
+            {"$limit": 1},
+            {"$lookup": {
+                "from": cls.name,
+                "localField": "controller",
+                "foreignField": "_id",
+                "as": "owner"
+            }},
+            {"$project": {
+                "user": {field: f"${field}" for field in UserRecord.projection()},
+                "owner": {"$arrayElemAt": ["$owner", 0]}
+            }},
+            {"$project": {
+                "user": 1,
+                **{f"owner.{field}": 1 for field in OwnerRecord.projection()}
+            }},
+        ]
+        profile = next(iter(cls.collection.aggregate(pipeline)), None)
+        if profile is None:
+            raise UserNotRegisterd
+
+        return ProfileRecord.from_document(profile)
+
+    @staticmethod
+    def _user_query(
+        discord_id: Optional[int],
+        db_id: Optional[ObjectId],
+        as_user: Optional[int]
+    ) -> Dict[str, Any]:
         if db_id is not None:
-            user = cls.query.get(_id=ObjectId(db_id))
+            query = {"_id": ObjectId(db_id)}
         elif discord_id is not None:
-            user = cls.query.find({"discord_id": discord_id}).first()
+            query = {"discord_id": discord_id}
         else:
             raise ValueError(
                 "Cannot get document without either a Discord ID or a Database ID")
 
-        if user is None:
-            raise UserNotRegisterd
-        if as_user is not None and as_user in user.blocked:
-            raise UserNotRegisterd
-
-        return user
+        # Checked by the database, instead of scanning the blocked list.
+        if as_user is not None:
+            query["blocked"] = {"$ne": as_user}
+        return query
 
-    @classmethod
+    @asyncclassmethod
     def change_setting(
             cls,
             setting: str,
@@ -133,143 +453,417 @@ class DBUser(MappedClass):
             *,
             group: Optional[str] = None
     ):
-        user = cls.get_user(discord_id=discord_id, db_id=db_id)
+        user = cls.get_user.blocking(discord_id=discord_id, db_id=db_id)
 
         if group is not None:
             user[group][setting] = value
         else:
             user[setting] = value
 
-        DBManager.sessions[cls.name].flush()
+    @asyncclassmethod
+    def get_blocked(cls, discord_id: int) -> List[int]:
+        """The discord ids the user blocked. Not part of UserRecord, such that only /block list fetches the array."""
+        user = cls.collection.find_one({"discord_id": discord_id}, projection=["blocked"])
+        if user is None:
+            raise UserNotRegisterd
+        return user.get("blocked") or []
 
-    @classmethod
+    @asyncclassmethod
     def block(cls, blocker_id: int, to_block_id: int, *, unblock=False):
-        user = cls.get_user(discord_id=blocker_id)
+        """Atomically adds or removes to_block_id from the blocked list of the blocker.
+        Raises ValueError if the user was already (un)blocked, UserNotRegisterd if the blocker is not registered"""
         if unblock:
-            user.blocked.remove(to_block_id)
-        else:
-            if to_block_id in user.blocked:
-                raise ValueError
-            user.blocked.append(to_block_id)
-        DBManager.sessions[cls.name].flush()
-
-    @classmethod
-    def get_owned(cls, db_id: ObjectId) -> List[DBUser]:
-        return cls.query.find({"controller": db_id}).all()
-
-    @classmethod
-    def update(cls, discord_id: int, *, ref_count: Optional[int] = None):
-        data = cls.query.find({"discord_id": discord_id})
-        if data.count():
-            user = data.first()
-            user.last_active = datetime.utcnow()
+            result = cls.collection.update_one(
+                {"discord_id": blocker_id, "blocked": to_block_id},
+                {"$pull": {"blocked": to_block_id}}
+            )
         else:
-            user = cls(
-                discord_id=discord_id,
-                last_active=datetime.utcnow(),
-                join_date=datetime.utcnow()
+            result = cls.collection.update_one(
+                {"discord_id": blocker_id, "blocked": {"$ne": to_block_id}},
+                {"$addToSet": {"blocked": to_block_id}}
             )
-            user["controller"] = user._id
 
+        if not result.matched_count:
+            if cls.collection.find_one({"discord_id": blocker_id}, projection=["_id"]) is None:
+                raise UserNotRegisterd
+            raise ValueError
+
+    @asyncclassmethod
+    def get_owned(cls, db_id: ObjectId) -> List[UserRecord]:
+        """Returns the records of all users owned by the user, excluding the user themselves"""
+        if ownership_map.loaded:
+            owned_ids = ownership_map.get_owned(db_id)
+            if not owned_ids:
+                return []
+            return UserRecord.find(cls.collection, {"_id": {"$in": list(owned_ids)}})
+        return UserRecord.find(cls.collection, {"controller": db_id, "_id": {"$ne": db_id}})
+
+    @asyncclassmethod
+    def load_ownership(cls):
+        """Loads the ownership_map from the controller field of all users"""
+        users = cls.collection.find({}, projection=["controller"])
+        ownership_map.load({user["_id"]: user["controller"] for user in users})
+
+    @asyncclassmethod
+    def update(cls, discord_id: int, *, ref_count: Optional[int] = None):
+        """Sets last_active (and ref_counter if given) of the user, registering them if needed, in a single atomic upsert"""
+        now = datetime.utcnow()
+        changes: Dict[str, Any] = {"last_active": now}
         if ref_count is not None:
-            user.ref_counter = ref_count
-
-        DBManager.sessions[cls.name].flush()
+            changes["ref_counter"] = ref_count
+
+        new_document = cls._new_document(discord_id, last_active=now)
+        for field in changes:
+            del new_document[field]
+        cls.collection.update_one(
+            {"discord_id": discord_id},
+            {"$set": changes, "$setOnInsert": new_document},
+            upsert=True
+        )
+        last_active_tracker.remember(discord_id)
 
-    @classmethod
+    @asyncclassmethod
     def set_controller(cls, owned_id: str, *, new_owner_id: str, trusts: bool = False):
-        user = cls.get_user(db_id=owned_id)
+        user = cls.get_user.blocking(db_id=owned_id)
         user["controller"] = new_owner_id
         user["trusts"] = trusts
         DBManager.sessions[cls.name].flush()
+        ownership_map.set(user._id, ObjectId(new_owner_id))
+
+    @asyncclassmethod
+    def claim_controller(cls, owned_id: ObjectId, *, new_owner_id: ObjectId, trusts: bool = False) -> bool:
+        """Sets the controller of the user, only if they do not have an owner yet.
+        The condition is checked by the database, such that two concurrent claims cannot both succeed.
+        Returns whether the claim succeeded."""
+        result = cls.collection.update_one(
+            {"_id": owned_id, "controller": owned_id},
+            {"$set": {"controller": new_owner_id, "trusts": trusts}}
+        )
+        if result.matched_count == 0:
+            return False
+        ownership_map.set(owned_id, new_owner_id)
+        return True
 
-    @classmethod
+    @asyncclassmethod
     def join(cls, discord_id: int):
-        data = cls.query.find({"discord_id": discord_id})
-        if data.count():
-            user = data.first()
-            user.ref_counter += 1
-        else:
-            # A player who only joins a server should not be registered as having been active,
-            # to be imediatly removed on leave. datetime.min to keep typing consistent
-            user = cls(
-                discord_id=discord_id,
-                last_active=datetime.min,
-                join_date=datetime.utcnow()
-            )
-            user["controller"] = user._id
-        DBManager.sessions[cls.name].flush()
+        """Increments the ref_counter of the user, registering them if needed, in a single atomic upsert"""
+        cls.collection.update_one(
+            {"discord_id": discord_id},
+            cls._join_update(discord_id),
+            upsert=True
+        )
 
-    @classmethod
+    @asyncclassmethod
     def leave(cls, discord_id: int, *, delete_time: timedelta):
-        data = cls.query.find({"discord_id": discord_id})
-        if data.count():
-            user = data.first()
-            user.ref_counter -= 1
-            if (user.ref_counter <= 0) and (datetime.utcnow() - user.last_active > delete_time):
-                cls.unregister(db_id=user._id)
-            DBManager.sessions[cls.name].flush()
+        """Decrements the ref_counter of the user, and deletes them if they are in no guild anymore,
+        and were inactive for longer than delete_time.
+        The deletion condition is checked by the database, such that a concurrent join or activity keeps the user."""
+        user = cls.collection.find_one_and_update(
+            {"discord_id": discord_id},
+            {"$inc": {"ref_counter": -1}},
+            projection=["ref_counter"],
+            return_document=ReturnDocument.AFTER
+        )
+        if user is None or user["ref_counter"] > 0:
+            return
+
+        now = datetime.utcnow()
+        # Activity that is not yet written to the database
+        if now - last_active_tracker.last_active(discord_id, default=datetime.min) <= delete_time:
+            return
+
+        result = cls.collection.delete_one({
+            "_id": user["_id"],
+            "ref_counter": {"$lte": 0},
+            "last_active": {"$lt": now - delete_time}
+        })
+        if result.deleted_count:
+            cls._release_owned([user["_id"]])
+            last_active_tracker.forget(discord_id)
+            ownership_map.remove(user["_id"])
 
     @classmethod
-    def register(cls, discord_id: int):
-        if cls.query.find({"discord_id": discord_id}).count():
-            raise UserAlreadyRegisterd
-        user = cls(
-            discord_id=discord_id,
-            last_active=datetime.utcnow(),
-            join_date=datetime.utcnow()
+    def _join_update(cls, discord_id: int) -> Dict[str, Any]:
+        # A player who only joins a server should not be registered as having been active,
+        # to be imediatly removed on leave. datetime.min to keep typing consistent
+        # New users start with a ref_counter of 1 through the $inc.
+        new_document = cls._new_document(discord_id, last_active=datetime.min)
+        del new_document["ref_counter"]
+        return {"$setOnInsert": new_document, "$inc": {"ref_counter": 1}}
+
+    @classmethod
+    def _new_document(cls, discord_id: int, *, last_active: datetime) -> Dict[str, Any]:
+        """A complete document of a new user, with all defaults filled in, that controls itself"""
+        document = dict(mapper(cls).collection.make({
+            "discord_id": discord_id,
+            "last_active": last_active,
+            "join_date": datetime.utcnow()
+        }))
+        document["controller"] = document["_id"]
+        return document
+
+    @classmethod
+    async def join_many(cls, discord_ids: List[int]):
+        """DBUser.join for every discord_id, in batched bulk operations.
+        Yields to the event loop between batches, and logs the progress."""
+        done = 0
+        for batch in chunked(discord_ids, BULK_BATCH_SIZE):
+            await cls._join_batch(batch)
+            done += len(batch)
+            logging.info(f"Bulk join: {done}/{len(discord_ids)} members")
+
+    @asyncclassmethod
+    def _join_batch(cls, discord_ids: List[int]):
+        cls.collection.bulk_write([
+            UpdateOne({"discord_id": discord_id}, cls._join_update(discord_id), upsert=True)
+            for discord_id in discord_ids
+        ], ordered=False)
+
+    @classmethod
+    async def leave_many(cls, discord_ids: List[int], *, delete_time: timedelta):
+        """DBUser.leave for every discord_id, in batched bulk operations.
+        Yields to the event loop between batches, and logs the progress."""
+        done = 0
+        deleted = 0
+        for batch in chunked(discord_ids, BULK_BATCH_SIZE):
+            deleted += await cls._leave_batch(batch, delete_time=delete_time)
+            done += len(batch)
+            logging.info(f"Bulk leave: {done}/{len(discord_ids)} members, {deleted} users deleted")
+
+    @asyncclassmethod
+    def _leave_batch(cls, discord_ids: List[int], *, delete_time: timedelta) -> int:
+        """Returns the amount of users deleted"""
+        cls.collection.bulk_write([
+            UpdateOne({"discord_id": discord_id}, {"$inc": {"ref_counter": -1}})
+            for discord_id in discord_ids
+        ], ordered=False)
+
+        unreferenced = cls.collection.find(
+            {"discord_id": {"$in": discord_ids}, "ref_counter": {"$lte": 0}},
+            projection=["discord_id", "last_active"]
         )
-        user["controller"] = user._id
-        DBManager.sessions[cls.name].flush()
+        now = datetime.utcnow()
+        to_delete: List[Dict[str, Any]] = [
+            user for user in unreferenced
+            if now - last_active_tracker.last_active(
+                user["discord_id"], default=user["last_active"]) > delete_time
+        ]
+        if not to_delete:
+            return 0
+        return len(cls._delete_unreferenced(to_delete, delete_before=now - delete_time))
 
     @classmethod
+    def _delete_unreferenced(cls, users: List[Dict[str, Any]], *, delete_before: datetime) -> List[Dict[str, Any]]:
+        """Deletes the users, as long as the database still agrees they are in no guild and inactive since delete_before.
+        A join or activity written after they were read keeps them, like the single user delete in leave.
+        Releases the users owned by the deleted users, and returns the users that were actually deleted."""
+        db_ids = [user["_id"] for user in users]
+        cls.collection.delete_many({
+            "_id": {"$in": db_ids},
+            "ref_counter": {"$lte": 0},
+            "last_active": {"$lt": delete_before}
+        })
+        remaining: Set[ObjectId] = {
+            user["_id"] for user in cls.collection.find({"_id": {"$in": db_ids}}, projection=["_id"])
+        }
+        deleted = [user for user in users if user["_id"] not in remaining]
+        if deleted:
+            cls._release_owned([user["_id"] for user in deleted])
+        for user in deleted:
+            last_active_tracker.forget(user["discord_id"])
+            ownership_map.remove(user["_id"])
+        return deleted
+
+    @asyncclassmethod
+    def register(cls, discord_id: int):
+        """Registers the user in a single atomic upsert, raises UserAlreadyRegisterd if they already were"""
+        result = cls.collection.update_one(
+            {"discord_id": discord_id},
+            {"$setOnInsert": cls._new_document(discord_id, last_active=datetime.utcnow())},
+            upsert=True
+        )
+        if result.upserted_id is None:
+            raise UserAlreadyRegisterd
+
+    @asyncclassmethod
     def unregister(
         cls,
         *,
         discord_id: Optional[int] = None,
         db_id: Optional[ObjectId] = None,
     ):
-        user: DBUser = cls.get_user(discord_id=discord_id, db_id=db_id)
+        user: DBUser = cls.get_user.blocking(discord_id=discord_id, db_id=db_id)
 
-        owned: List[DBUser] = cls.get_owned(db_id=user._id)
-        actually_owned = [
-            owned_user for owned_user in owned if owned_user._id != user._id]
-        for owned_user in actually_owned:
-            cls.set_controller(owned_user._id, new_owner_id=owned_user._id)
+        owned: List[UserRecord] = cls.get_owned.blocking(db_id=user._id)
+        for owned_user in owned:
+            cls.set_controller.blocking(owned_user._id, new_owner_id=owned_user._id)
 
+        last_active_tracker.forget(user.discord_id)
         user.delete()
         DBManager.sessions[cls.name].flush()
+        ownership_map.remove(user._id)
+
+    @asyncclassmethod
+    def set_last_active(cls, last_active: Dict[int, datetime]):
+        """Sets the last_active of every discord_id in the dict, in batched bulk operations"""
+        updates = (
+            UpdateOne({"discord_id": discord_id}, {"$set": {"last_active": time}})
+            for discord_id, time in last_active.items()
+        )
+        for batch in chunked(updates, BULK_BATCH_SIZE):
+            cls.collection.bulk_write(batch, ordered=False)
+
+    @asyncclassmethod
+    def update_database(cls, member_counts: Counter[int], *, delete_time: timedelta) -> int:
+        """Sets the ref_counter of every user to the amount of guilds they are a member of,
+        and deletes the users that are in none and were inactive for longer than delete_time.
+        Returns the amount of users updated or deleted.
+        Users are streamed with only the needed fields, and all changes are applied in batched bulk operations."""
+        delete_before = datetime.utcnow() - delete_time
+        users = cls.collection.find(
+            {}, projection=["discord_id", "ref_counter", "last_active"])
+
+        updates: List[UpdateOne] = []
+        to_delete: List[Dict[str, Any]] = []
+        updated = 0
+        for user in users:
+            ref_counter = member_counts.get(user["discord_id"], 0)
+            # Also for the users about to be deleted, the delete checks the stored ref_counter.
+            # Only if unchanged since it was read, such that a concurrent join or leave is kept.
+            if ref_counter != user.get("ref_counter"):
+                updates.append(UpdateOne(
+                    {"_id": user["_id"], "ref_counter": user.get("ref_counter")},
+                    {"$set": {"ref_counter": ref_counter}}
+                ))
+            if ref_counter <= 0 and user["last_active"] < delete_before:
+                to_delete.append(user)
+
+            if len(updates) >= BULK_BATCH_SIZE:
+                cls.collection.bulk_write(updates, ordered=False)
+                updated += len(updates)
+                updates = []
+
+        if updates:
+            cls.collection.bulk_write(updates, ordered=False)
+            updated += len(updates)
+
+        # Users that joined or were active since they were read are kept
+        deleted = 0
+        for batch in chunked(to_delete, BULK_BATCH_SIZE):
+            deleted += len(cls._delete_unreferenced(batch, delete_before=delete_before))
+
+        logging.info(
+            f"Database update: updated {updated} reference counters, deleted {deleted} users")
+        return updated + deleted
 
     @classmethod
-    def update_database(cls, user_ids: List[str], *, delete_time: timedelta):
-        users = cls.query.find({}).all()
-        for user in users:
-            user.ref_counter = user_ids.count(user.discord_id)
-            if (user.ref_counter <= 0) and (datetime.utcnow() - user.last_active > delete_time):
-                # Unregister without the DB flush
-                owned: List[DBUser] = cls.get_owned(db_id=user._id)
-                actually_owned = [
-                    owned_user for owned_user in owned if owned_user._id != user._id]
-                for owned_user in actually_owned:
-                    cls.set_controller(
-                        owned_user._id, new_owner_id=owned_user._id)
-                user.delete()
-        DBManager.sessions[cls.name].flush()
+    def _release_owned(cls, db_ids: List[ObjectId]):
+        """Resets the controller of every user owned by one of db_ids to themselves, in a single bulk operation.
+        Users within db_ids are skipped, as those are about to be deleted."""
+        owned = cls.collection.find(
+            {"controller": {"$in": db_ids}, "_id": {"$nin": db_ids}},
+            projection=["_id"]
+        )
+        owned_ids: List[ObjectId] = [owned_user["_id"] for owned_user in owned]
+        if owned_ids:
+            cls.collection.bulk_write([
+                UpdateOne(
+                    {"_id": owned_id},
+                    {"$set": {"controller": owned_id, "trusts": False}}
+                )
+                for owned_id in owned_ids
+            ], ordered=False)
+        for owned_id in owned_ids:
+            ownership_map.set(owned_id, owned_id)
+
+    @asyncclassmethod
+    def release_derelict(cls, *, derelict_time: timedelta) -> List[Tuple[int, int]]:
+        """Resets the controller of every user whose controller was inactive for longer than derelict_time.
+        Only the actual owners are looked at: from the ownership_map if loaded, otherwise starting from the owned users.
+        Returns the (owner discord_id, owned discord_id) pair of every released user"""
+        derelict_before = datetime.utcnow() - derelict_time
+        if ownership_map.loaded:
+            owned = cls._owned_by_derelict_from_map(derelict_before)
+        else:
+            owned = cls._owned_by_derelict_from_lookup(derelict_before)
+
+        released: List[Tuple[int, int]] = []
+        for batch in chunked(owned, BULK_BATCH_SIZE):
+            # Matching on the controller as well, such that a concurrent change of owner is kept
+            cls.collection.bulk_write([
+                UpdateOne(
+                    {"_id": user["_id"], "controller": user["controller"]},
+                    {"$set": {"controller": user["_id"], "trusts": False}}
+                )
+                for user in batch
+            ], ordered=False)
+            # Only the users the guarded write matched are released now
+            released_ids = {
+                released_user["_id"] for released_user in cls.collection.find(
+                    {"_id": {"$in": [user["_id"] for user in batch]}},
+                    projection=["controller"])
+                if released_user["controller"] == released_user["_id"]
+            }
+            for user in batch:
+                if user["_id"] not in released_ids:
+                    continue
+                ownership_map.set(user["_id"], user["_id"])
+                released.append((user["owner_discord_id"], user["discord_id"]))
+
+        logging.info(f"Derelict sweep: released {len(released)} users")
+        return released
+
+    @classmethod
+    def _owned_by_derelict_from_map(cls, derelict_before: datetime) -> List[Dict[str, Any]]:
+        """The owned users of the derelict owners, the owners being the ones in the ownership_map"""
+        owned: List[Dict[str, Any]] = []
+        for batch in chunked(ownership_map.owners(), BULK_BATCH_SIZE):
+            derelict: Dict[ObjectId, int] = {
+                user["_id"]: user["discord_id"] for user in cls.collection.find(
+                    {"_id": {"$in": batch}, "last_active": {"$lt": derelict_before}},
+                    projection=["discord_id"])
+            }
+            if not derelict:
+                continue
+            for user in cls.collection.find(
+                    {"controller": {"$in": list(derelict)}},
+                    projection=["discord_id", "controller"]):
+                if user["controller"] != user["_id"]:
+                    user["owner_discord_id"] = derelict[user["controller"]]
+                    owned.append(user)
+        return owned
 
-    # Initialise the Reference Count Updater, and make it accessible for the scheduler.
     @classmethod
-    def init_updater(cls, bot):
-        global database_updater
-        database_updater = RefCountUpdater(bot=bot)
+    def _owned_by_derelict_from_lookup(cls, derelict_before: datetime) -> List[Dict[str, Any]]:
+        """The owned users of the derelict owners, in a single aggregation that starts from the owned users"""
+        return list(cls.collection.aggregate([
+            {"$match": {"$expr": {"$ne": ["$controller", "$_id"]}}},
+            {"$lookup": {
+                "from": cls.name,
+                "localField": "controller",
+                "foreignField": "_id",
+                "as": "owner"
+            }},
+            {"$unwind": "$owner"},
+            {"$match": {"owner.last_active": {"$lt": derelict_before}}},
+            {"$project": {"discord_id": 1, "controller": 1, "owner_discord_id": "$owner.discord_id"}},
+        ]))
+
+    # Initialise the Reference Count Updater and the Derelict Sweeper, and make them accessible for the scheduler.
+    @classmethod
+    def init_updater(cls, bot, *, on_released: Optional[Callable[[List[Tuple[int, int]]], Awaitable[None]]] = None):
+        global database_updater, derelict_sweeper
+        # Coroutine functions are stored, such that the scheduler recognises them as coroutines and awaits them.
+        # Both walk large parts of the users collection, so their database calls run on the job executor.
+        database_updater = scheduled_job("update_database", heavy=True)(RefCountUpdater(bot=bot).__call__)
+        derelict_sweeper = scheduled_job("sweep_derelict", heavy=True)(
+            DerelictSweeper(bot=bot, on_released=on_released).__call__)
 
     # TODO make this not just dump the database entry, and/or make it dump more stuff, like kink information and the like.
 
-    @classmethod
+    @asyncclassmethod
     def get_settings(cls, discord_id: int) -> str:
-        user = cls.get_user(discord_id=discord_id)
-        user.last_active = datetime.utcnow()
-        DBManager.sessions[cls.name].flush()
+        user = cls.get_user.blocking(discord_id=discord_id)
+        last_active_tracker.touch(discord_id)
+        last_active_tracker.remember(discord_id)
         return str(user)
-
-
-Mapper.compile_all()
@@ -1,3 +1,7 @@
+import time
+# Taken before the other imports, such that the startup time includes them
+started = time.perf_counter()
+
 import os
 import asyncio
 import logging
@@ -7,15 +11,22 @@ from datetime import timedelta
 
 import discord
 from discord.ext import commands
-from beartype import beartype
+from utils import typechecked
 from beartype.typing import List
 
 from database import connect
 from cogs import extensions
+from utils import startup_timer
+
+startup_timer.set_started(started)
+startup_timer.record("imports", time.perf_counter() - started)
+
+# How long the database connection and index creation may take, before the bot continues without waiting for it.
+DATABASE_WARM_UP_TIMEOUT = 30
 
 
-class BeezlebubBot(commands.Bot):
-    @beartype
+class BeezlebubBot(commands.AutoShardedBot):
+    @typechecked
     def __init__(
         self,
         *args,
@@ -24,6 +35,8 @@ class BeezlebubBot(commands.Bot):
         date_format: str,
         derelict_time: timedelta,
         user_delete_time: timedelta,
+        activity_flush_interval: timedelta,
+        derelict_sweep_interval: timedelta,
         **kwargs,
     ):
         super().__init__(*args, **kwargs)
@@ -32,21 +45,64 @@ class BeezlebubBot(commands.Bot):
         self.date_format = date_format
         self.derelict_time = derelict_time
         self.user_delete_time = user_delete_time
+        self.activity_flush_interval = activity_flush_interval
+        self.derelict_sweep_interval = derelict_sweep_interval
 
         self.setup_hook()
 
+    @property
+    def runs_all_shards(self) -> bool:
+        """Whether this process sees every guild, when the shards are spread over multiple processes it does not"""
+        return self.shard_ids is None or len(self.shard_ids) >= (self.shard_count or 1)
+
+    @property
+    def jobs_collection(self) -> str:
+        """The scheduler jobstore of this process, every process runs its own scheduled jobs for its own shards"""
+        if self.runs_all_shards:
+            return "jobs"
+        return "jobs_shards_" + "_".join(str(shard_id) for shard_id in sorted(self.shard_ids))
+
     def setup_hook(self):
         logging.info("=== Starting ===")
 
-        # Establish database connection
-        self.database_manager = connect.DBManager(uri=self.datastore)
+        # Create the datastore, the connection itself is only opened by warm_up_database
+        with startup_timer.phase("datastore"):
+            self.database_manager = connect.DBManager(uri=self.datastore)
 
         # Load bot management first, and without posibility of unload
-        self.load_extensions("cogs.bot_management", store=False)
+        with startup_timer.phase("extension cogs.bot_management"):
+            self.load_extensions("cogs.bot_management", store=False)
 
         # Load all other extensions
         for extension in self.init_extensions:
-            self.load_extensions(extension, store=False)
+            with startup_timer.phase(f"extension {extension}"):
+                self.load_extensions(extension, store=False)
+
+        # All mapped classes are imported by now
+        with startup_timer.phase("mappers"):
+            connect.DBManager.compile_mappers()
+
+    async def start(self, *args, **kwargs):
+        # Connecting to MongoDB runs concurrently with the login and gateway connection
+        self.database_warm_up = asyncio.create_task(self.warm_up_database())
+        await super().start(*args, **kwargs)
+
+    async def login(self, *args, **kwargs):
+        with startup_timer.phase("login"):
+            await super().login(*args, **kwargs)
+
+    async def warm_up_database(self):
+        """Opens the connection to MongoDB by creating the indexes, bounded by DATABASE_WARM_UP_TIMEOUT
+        Nothing awaits this task, so every error is logged here, also to the log file of the discord logger."""
+        logger = logging.getLogger("discord")
+        try:
+            with startup_timer.phase("database"):
+                await asyncio.wait_for(connect.DBManager.ensure_indexes(), DATABASE_WARM_UP_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.error(
+                f"Database did not respond within {DATABASE_WARM_UP_TIMEOUT}s, continuing without indexes")
+        except Exception:
+            logger.exception("Database warm up failed, continuing without indexes")
 
 
 def logger_setup():
@@ -87,15 +143,26 @@ def main():
     date_format = "%d %b %Y"
     derelict_time = timedelta(days=10)
     user_delete_time = timedelta(days=93)
+    activity_flush_interval = timedelta(seconds=30)
+    derelict_sweep_interval = timedelta(hours=1)
+
+    # Without SHARD_COUNT the shard count is the one recommended by discord, and this process runs all shards.
+    # To spread the shards over multiple processes, give every process the same SHARD_COUNT and its own SHARD_IDS.
+    shard_count = int(os.getenv("SHARD_COUNT")) if os.getenv("SHARD_COUNT") else None
+    shard_ids = [int(shard_id) for shard_id in os.getenv("SHARD_IDS").split(",")] if os.getenv("SHARD_IDS") else None
 
     bot = BeezlebubBot(
         commands.when_mentioned_or('!'),
         extensions=extensions,
         intents=intents,
+        shard_count=shard_count,
+        shard_ids=shard_ids,
         datastore=datastore,
         date_format=date_format,
         derelict_time=derelict_time,
-        user_delete_time=user_delete_time
+        user_delete_time=user_delete_time,
+        activity_flush_interval=activity_flush_interval,
+        derelict_sweep_interval=derelict_sweep_interval
     )
     bot.run(os.getenv("BOTTOKEN"))
 
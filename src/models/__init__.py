@@ -1,11 +1,14 @@
 from .context_errors import ManagedCommandError, UnmanagedCommandError
 from .context import ModelNoneCTX, ModelACTX, ModelCCTX, ModelVCTX
+from .loader import PlayerLoader
+from .notifications import NotificationWorker, notification_worker
 from .player import Player, InvalidScope, create_player
 from .channel import MainTextChannel, create_main_text_channel
 
 __all__ = (
     "ManagedCommandError", "UnmanagedCommandError",
-    "ModelNoneCTX", "ModelACTX", "ModelCCTX", "ModelVCTX",
+    "ModelNoneCTX", "ModelACTX", "ModelCCTX", "ModelVCTX", "PlayerLoader",
+    "NotificationWorker", "notification_worker",
     "Player", "InvalidScope", "create_player",
     "MainTextChannel", "create_main_text_channel"
 )
@@ -2,23 +2,22 @@ from __future__ import annotations
 
 import discord
 from discord import abc
-from beartype import beartype
 from beartype.abby import is_bearable
 from beartype.typing import Union, Optional
 
-from utils import mention_to_id, MessageChannel
+from utils import mention_to_id, MessageChannel, typechecked
 from .context import ModelContext
 
 
 class MainTextChannel:
     """A wrapper class for a guild text channel"""
 
-    @beartype
+    @typechecked
     def __init__(self, *, context: ModelContext):
         self.context = context
 
     @classmethod
-    @beartype
+    @typechecked
     async def from_mention(
         cls,
         mention_string: str,
@@ -37,7 +36,7 @@ class MainTextChannel:
         return await cls._init(discord_id=discord_id, context=context, **kwargs)
 
     @classmethod
-    @beartype
+    @typechecked
     async def _init(
             cls,
             *,
@@ -73,6 +72,6 @@ class MainTextChannel:
         return instance
 
 
-@beartype
+@typechecked
 async def create_main_text_channel(*args, **kwargs) -> MainTextChannel:
     return await MainTextChannel._init(*args, **kwargs)
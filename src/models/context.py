@@ -1,11 +1,11 @@
 from __future__ import annotations
 
 import discord
-from beartype import beartype
-from beartype.typing import Protocol
+from beartype.typing import Optional, Protocol
 
-from utils import MessageChannel
+from utils import MessageChannel, typechecked
 from .context_errors import ManagedCommandError, UnmanagedCommandError
+from .loader import PlayerLoader
 
 
 class InvalidContext(Exception):
@@ -22,6 +22,11 @@ class ModelContext(Protocol):
         """The main bot object of the context, such that any models can access it."""
         raise NotImplementedError
 
+    @property
+    def loader(self) -> PlayerLoader:
+        """The identity map of the players of the context, such that every user is loaded at most once."""
+        raise NotImplementedError
+
     async def exit(self, message: str) -> None:
         """The method to be called to respond to the context and raise a ManagedCommandError"""
         raise NotImplementedError
@@ -30,41 +35,57 @@ class ModelContext(Protocol):
 class ModelNoneCTX(ModelContext):
     """A model context that only trows an error.
     This should only be used if the error will be catched elsewhere."""
-    __slots__ = ("_bot")
+    __slots__ = ("_bot", "_loader")
 
-    @beartype
-    def __init__(self, *, bot: discord.ext.commands.Bot):
+    @typechecked
+    def __init__(self, *, bot: discord.ext.commands.Bot, loader: Optional[PlayerLoader] = None):
         self._bot = bot
+        self._loader = loader or PlayerLoader()
 
     @property
-    @beartype
+    @typechecked
     def bot(self) -> discord.ext.commands.Bot:
         return self._bot
 
-    @beartype
+    @property
+    @typechecked
+    def loader(self) -> PlayerLoader:
+        return self._loader
+
+    @typechecked
     async def exit(self, message: str) -> None:
         raise UnmanagedCommandError(message)
 
     @classmethod
-    @beartype
+    @typechecked
     def from_other(cls, context: ModelContext):
-        return cls(bot=context.bot)
+        """Keeps the loader of the other context, the players still belong to the same interaction."""
+        return cls(bot=context.bot, loader=context.loader)
 
 
 class ModelACTX(ModelContext):
     """A ModelContext from a discord ApplicationContext"""
     __slots__ = ("ctx")
 
-    @beartype
+    @typechecked
     def __init__(self, ctx: discord.ApplicationContext):
         self.ctx = ctx
 
     @property
-    @beartype
+    @typechecked
     def bot(self) -> discord.ext.commands.Bot:
         return self.ctx.bot
 
-    @beartype
+    @property
+    @typechecked
+    def loader(self) -> PlayerLoader:
+        # Stored on the ApplicationContext, such that every ModelACTX of the same command shares it
+        loader: Optional[PlayerLoader] = getattr(self.ctx, "player_loader", None)
+        if loader is None:
+            loader = self.ctx.player_loader = PlayerLoader()
+        return loader
+
+    @typechecked
     async def exit(self, message: str) -> None:
         await self.ctx.respond(message, ephemeral=True)
         raise ManagedCommandError
@@ -72,19 +93,25 @@ class ModelACTX(ModelContext):
 
 class ModelCCTX(ModelContext):
     """A ModelContext from a discord TextChannel & Bot"""
-    __slots__ = ("channel", "_bot")
+    __slots__ = ("channel", "_bot", "_loader")
 
-    @beartype
+    @typechecked
     def __init__(self, *, channel: MessageChannel, bot: discord.ext.commands.Bot):
         self.channel = channel
         self._bot = bot
+        self._loader = PlayerLoader()
 
     @property
-    @beartype
+    @typechecked
     def bot(self) -> discord.ext.commands.Bot:
         return self._bot
 
-    @beartype
+    @property
+    @typechecked
+    def loader(self) -> PlayerLoader:
+        return self._loader
+
+    @typechecked
     async def exit(self, message: str) -> None:
         from resources import create_error_embed
         embed: discord.Embed = create_error_embed(message)
@@ -94,19 +121,25 @@ class ModelCCTX(ModelContext):
 
 class ModelVCTX(ModelContext):
     """A model context for a view, from a message & bot"""
-    __slots__ = ("message", "_bot")
+    __slots__ = ("message", "_bot", "_loader")
 
-    @beartype
+    @typechecked
     def __init__(self, *, message: discord.Message, bot: discord.ext.commands.Bot):
         self.message = message
         self._bot = bot
+        self._loader = PlayerLoader()
 
     @property
-    @beartype
+    @typechecked
     def bot(self) -> discord.ext.commands.Bot:
         return self._bot
 
-    @beartype
+    @property
+    @typechecked
+    def loader(self) -> PlayerLoader:
+        return self._loader
+
+    @typechecked
     async def exit(self, message: str) -> None:
         from resources import create_error_embed
         embed: discord.Embed = create_error_embed(message)
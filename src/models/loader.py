@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import asyncio
+
+import discord
+from beartype.typing import Dict, Iterable, Optional, Tuple, Union
+from bson.objectid import ObjectId
+
+from database.user import DBUser, UserRecord, UserNotRegisterd
+from utils import user_resolver, DiscordMember, typechecked
+
+# A discord id or database id, paired with the as_user of the request if any
+LoaderKey = Union[int, ObjectId, Tuple[Union[int, ObjectId], int]]
+
+
+class PlayerLoader:
+    """Identity map of the players of a single command or view callback.
+    Every user record and discord user requested through it is loaded at most once,
+    concurrent requests for the same user share a single load.
+    Features:
+    - Records are stored under both their discord id and database id, loading by either finds the other
+    - Users that are not registered are remembered as well
+    - Requests with as_user are stored apart, the block is checked by the database query like in DBUser.get_record
+    - Records from bulk queries can be added, such that the players built from them do not query again
+
+    Records are not updated on writes, Player invalidates the records it writes to."""
+    __slots__ = ("_records", "_pending", "_discord")
+
+    def __init__(self):
+        self._records: Dict[LoaderKey, Optional[UserRecord]] = {}
+        self._pending: Dict[LoaderKey, asyncio.Task] = {}
+        self._discord: Dict[int, DiscordMember] = {}
+
+    @typechecked
+    async def get_record(
+        self,
+        *,
+        discord_id: Optional[int] = None,
+        db_id: Optional[ObjectId] = None,
+        as_user: Optional[int] = None
+    ) -> UserRecord:
+        """DBUser.get_record, loaded at most once per user.
+        Raises UserNotRegisterd and ValueError like DBUser.get_record"""
+        user_key: Union[int, ObjectId, None] = db_id if db_id is not None else discord_id
+        if user_key is None:
+            raise ValueError(
+                "Cannot get document without either a Discord ID or a Database ID")
+        key: LoaderKey = user_key if as_user is None else (user_key, as_user)
+
+        try:
+            record = self._records[key]
+        except KeyError:
+            task = self._pending.get(key)
+            if task is None:
+                task = asyncio.create_task(self._load(key, discord_id=discord_id, db_id=db_id, as_user=as_user))
+                self._pending[key] = task
+                task.add_done_callback(
+                    lambda _: self._pending.pop(key, None))
+            # Shielded, such that a cancelled caller does not cancel the load for the others.
+            record = await asyncio.shield(task)
+
+        if record is None:
+            raise UserNotRegisterd
+        return record
+
+    async def _load(
+        self,
+        key: LoaderKey,
+        *,
+        discord_id: Optional[int],
+        db_id: Optional[ObjectId],
+        as_user: Optional[int]
+    ) -> Optional[UserRecord]:
+        try:
+            record = await DBUser.get_record(discord_id=discord_id, db_id=db_id, as_user=as_user)
+        except UserNotRegisterd:
+            self._records[key] = None
+            return None
+        # Also a valid answer to requests without as_user
+        self.add_records([record])
+        self._records[key] = record
+        return record
+
+    def add_records(self, records: Iterable[UserRecord]):
+        """Stores records loaded elsewhere, replacing any stored version"""
+        for record in records:
+            self._records[record._id] = record
+            self._records[record.discord_id] = record
+
+    def invalidate(self, record: UserRecord):
+        """Forgets the record, such that the next request loads it again"""
+        user_keys = {record._id, record.discord_id}
+        for key in [key for key in self._records if (key[0] if isinstance(key, tuple) else key) in user_keys]:
+            del self._records[key]
+
+    @typechecked
+    async def get_discord(self, discord_id: int, *, bot: discord.ext.commands.Bot) -> Optional[DiscordMember]:
+        """user_resolver.get, remembered for the rest of the interaction.
+        Returns None if the user does not exist."""
+        user: Optional[DiscordMember] = self._discord.get(discord_id)
+        if user is None:
+            user = await user_resolver.get(discord_id, bot=bot)
+            if user is not None:
+                self._discord[discord_id] = user
+        return user
+
+    def add_discord(self, user: DiscordMember):
+        self._discord[user.id] = user
@@ -0,0 +1,191 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import discord
+from beartype.typing import Any, Dict, List, Optional
+
+from database.notifications import NotificationOutbox
+from utils import metrics, user_resolver, MessageChannel, typechecked
+
+# Limits of discord: the characters in an embed description, and the embeds in a single message
+EMBED_DESCRIPTION_LIMIT = 4096
+EMBEDS_PER_MESSAGE = 10
+# Limit of discord: the characters of all embeds in a single message together
+EMBEDS_TOTAL_LIMIT = 6000
+
+
+class NotificationWorker:
+    """Sends the notifications queued in the NotificationOutbox as DMs, in the background.
+    Features:
+    - All pending notifications of a user are sent together, as a single embed
+    - The DM channel ids are cached, such that the DM channel of a user is only resolved once
+    - At most max_concurrent users are sent to at the same time, every user is a separate rate limit route
+    - Failed sends are retried with exponential backoff, or after the retry_after of a rate limit, up to max_attempts
+    - Notifications to users that do not accept DMs from the bot are dropped quietly"""
+
+    @typechecked
+    def __init__(
+        self,
+        *,
+        batch_size: int = 50,
+        lease: timedelta = timedelta(minutes=2),
+        max_concurrent: int = 4,
+        max_attempts: int = 5,
+        retry_delay: timedelta = timedelta(seconds=30),
+        poll_interval: float = 60,
+        dm_cache_size: int = 4096
+    ):
+        self.batch_size = batch_size
+        self.lease = lease
+        self.max_concurrent = max_concurrent
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+        self.dm_cache_size = dm_cache_size
+        self.bot: Optional[discord.ext.commands.Bot] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()
+        self._dm_channels: OrderedDict[int, int] = OrderedDict()
+
+    def start(self, bot: discord.ext.commands.Bot):
+        """Starts the worker, can be called multiple times without issue"""
+        self.bot = bot
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    def wake(self):
+        """Lets the worker look for new notifications right away, instead of after poll_interval"""
+        self._wake.set()
+
+    async def _run(self):
+        semaphore = asyncio.Semaphore(self.max_concurrent)
+        indexed = False
+        while True:
+            self._wake.clear()
+            try:
+                # Retried every poll, such that a database that is briefly unavailable does not stop the worker
+                if not indexed:
+                    await NotificationOutbox.ensure_indexes()
+                    indexed = True
+                claimed = await NotificationOutbox.claim(limit=self.batch_size, lease=self.lease)
+            except Exception as error:
+                logging.warning(f"Could not claim notifications: {error}")
+                claimed = {}
+
+            if claimed:
+                try:
+                    await asyncio.gather(*(
+                        self._deliver(discord_id, notifications, semaphore)
+                        for discord_id, notifications in claimed.items()
+                    ))
+                except Exception:
+                    # Left claimed, they become available again once the lease expires
+                    logging.exception("Could not deliver the claimed notifications")
+                # More notifications might be waiting
+                continue
+
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _deliver(self, discord_id: int, notifications: List[Dict[str, Any]], semaphore: asyncio.Semaphore):
+        notification_ids = [notification["_id"] for notification in notifications]
+        try:
+            async with semaphore:
+                await self._send(discord_id, [notification["message"] for notification in notifications])
+        except (discord.Forbidden, discord.NotFound):
+            # The user does not accept DMs from the bot, or does not exist anymore
+            self._dm_channels.pop(discord_id, None)
+        except discord.HTTPException as error:
+            attempts = max(notification["attempts"] for notification in notifications) + 1
+            if attempts < self.max_attempts:
+                delay = self.retry_delay * 2 ** (attempts - 1)
+                if error.status == 429:
+                    retry_after = float(error.response.headers.get("Retry-After", 0))
+                    delay = max(delay, timedelta(seconds=retry_after))
+                try:
+                    await NotificationOutbox.retry(notification_ids, delay=delay)
+                except Exception:
+                    # Left claimed, they become available again once the lease expires
+                    logging.exception(f"Could not reschedule the notifications to {discord_id}")
+                return
+            logging.warning(f"Dropped {len(notifications)} notifications to {discord_id} after {attempts} attempts: {error}")
+        except Exception as error:
+            # Left claimed, they become available again once the lease expires
+            logging.warning(f"Could not deliver notifications to {discord_id}: {error}")
+            return
+        else:
+            now = datetime.utcnow()
+            for notification in notifications:
+                metrics.observe("notification_delay_seconds", (now - notification["created"]).total_seconds())
+            metrics.observe("notifications_per_dm", len(notifications))
+
+        try:
+            await NotificationOutbox.complete(notification_ids)
+        except Exception:
+            # Sent again once the lease expires, a duplicate DM is better than a lost one
+            logging.exception(f"Could not complete the notifications to {discord_id}")
+
+    async def _send(self, discord_id: int, messages: List[str]):
+        from resources import create_notifications_embed
+        channel = await self._get_dm(discord_id)
+        if channel is None:
+            return
+        embeds = [create_notifications_embed(group) for group in self._group(messages)]
+        for message_embeds in self._split(embeds):
+            await channel.send(embeds=message_embeds)
+
+    async def _get_dm(self, discord_id: int) -> Optional[MessageChannel]:
+        """The DM channel of the user, None if the user does not exist"""
+        channel_id = self._dm_channels.get(discord_id)
+        if channel_id is not None:
+            self._dm_channels.move_to_end(discord_id)
+            return self.bot.get_partial_messageable(channel_id, type=discord.ChannelType.private)
+
+        user = await user_resolver.get(discord_id, bot=self.bot)
+        if user is None:
+            return None
+        channel: discord.DMChannel = user.dm_channel or await user.create_dm()
+        self._dm_channels[discord_id] = channel.id
+        while len(self._dm_channels) > self.dm_cache_size:
+            self._dm_channels.popitem(last=False)
+        return channel
+
+    @staticmethod
+    def _group(messages: List[str]) -> List[List[str]]:
+        """Splits the messages into groups that fit in the description of a single embed"""
+        groups: List[List[str]] = []
+        length = EMBED_DESCRIPTION_LIMIT
+        for message in messages:
+            message = message[:EMBED_DESCRIPTION_LIMIT]
+            # Two characters for the blank line between the messages
+            if length + 2 + len(message) > EMBED_DESCRIPTION_LIMIT:
+                groups.append([])
+                length = -2
+            groups[-1].append(message)
+            length += 2 + len(message)
+        return groups
+
+    @staticmethod
+    def _split(embeds: List[discord.Embed]) -> List[List[discord.Embed]]:
+        """Splits the embeds into messages that stay within the embed count and total characters of discord"""
+        messages: List[List[discord.Embed]] = []
+        length = EMBEDS_TOTAL_LIMIT
+        for embed in embeds:
+            full = len(messages) == 0 or len(messages[-1]) >= EMBEDS_PER_MESSAGE
+            if full or length + len(embed) > EMBEDS_TOTAL_LIMIT:
+                messages.append([])
+                length = 0
+            messages[-1].append(embed)
+            length += len(embed)
+        return messages
+
+
+notification_worker = NotificationWorker()
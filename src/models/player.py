@@ -4,14 +4,15 @@ import asyncio
 from datetime import datetime
 
 import discord
-from beartype import beartype
 from beartype.typing import List, Coroutine, Optional
 from bson.objectid import ObjectId
 
-from database.user import DBUser, UserNotRegisterd
-from utils import mention_to_id, get_player_name, DiscordMember
+from database.notifications import NotificationOutbox
+from database.user import DBUser, UserRecord, OwnerRecord, UserNotRegisterd, last_active_tracker
+from utils import mention_to_id, get_player_name, DiscordMember, typechecked
 from .context_errors import ManagedCommandError, UnmanagedCommandError
 from .context import ModelContext, ModelACTX, ModelNoneCTX
+from .notifications import notification_worker
 
 
 class InvalidScope(ValueError):
@@ -21,13 +22,15 @@ class InvalidScope(ValueError):
 
 class Player:
     """A wrapper class for a BeezelbubBot user. 
-    Contains discord, database, and future Chaster methods and commands"""
+    Contains discord, database, and future Chaster methods and commands
+    The database records and discord users are loaded through the PlayerLoader of the context,
+    such that players of the same interaction share them."""
 
-    @beartype
+    @typechecked
     def __init__(self, *, context: ModelContext):
         self.context = context
 
-    @beartype
+    @typechecked
     async def get_dm(self) -> discord.DMChannel:
         """Returns the DM channel of the bot with this user.
         Creates it if it didn't jet excist.
@@ -37,17 +40,21 @@ class Player:
             raise InvalidScope
         return self.discord.dm_channel or await self.discord.create_dm()
 
-    @beartype
+    @typechecked
     async def notify(self, message: str):
-        """Tries to send a Notification DM to the user.
-        Fails quietly if not able to."""
-        from resources import create_notification_embed
-        channel = await self.get_dm()
-        embed = create_notification_embed(message)
-        try:
-            await channel.send(embed=embed)
-        except discord.Forbidden:
-            pass
+        """Queues a Notification DM to the user, sent in the background by the notification_worker.
+        Fails quietly if the user does not accept DMs."""
+        await self.notify_all([self], message)
+
+    # Cannot be beartyped, "Player" object nested.
+    @staticmethod
+    async def notify_all(players: List[Player], message: str):
+        """notify for every player, queued in a single database call"""
+        await NotificationOutbox.enqueue_many([
+            (player.discord.id if hasattr(player, "discord") else player.db.discord_id, message)
+            for player in players
+        ])
+        notification_worker.wake()
 
     # Cannot be beartyped, "Player" object nested.
     async def update_owner(self) -> Optional[Player]:
@@ -60,7 +67,7 @@ class Player:
                 context=ModelNoneCTX.from_other(self.context)
             )
         except UnmanagedCommandError:
-            self._set_owner(self, trusts=False)
+            await self._set_owner(self, trusts=False)
             return None
 
         try:
@@ -71,15 +78,14 @@ class Player:
         if not self.has_owner:
             return None
         elif owner.derelict:
-            self._set_owner(self, trusts=False)
-            if hasattr(owner, "discord"):
-                await owner.notify(
-                    f"{self.discord.mention} is no longer owned by you because you went derelict")
+            await self._set_owner(self, trusts=False)
+            await owner.notify(
+                f"{self.discord.mention} is no longer owned by you because you went derelict")
             return None
         else:
             return owner
 
-    @beartype
+    @typechecked
     async def get_owner(self, *, context: Optional[ModelContext] = None, **kwargs) -> Player:
         """retuns a Player instance of the owner of the current player,
         initialised with the regular init kwargs in the present context
@@ -97,12 +103,14 @@ class Player:
             **kwargs
         )
 
-    @beartype
+    @typechecked
     async def set_owner(self, player: Player, *, trusts: bool):
-        """Sets the player's owner to the one specified if able to."""
+        """Sets the player's owner to the one specified if able to.
+        Derelict owners are released by the periodic derelict sweep, not checked here.
+        The checks below use the loaded record, which may be outdated (e.g. in a view callback),
+        the claim itself is conditional on the player not having an owner in the database."""
         if not hasattr(self, "discord") or not hasattr(player, "discord"):
             raise InvalidScope
-        await self.update_owner()
 
         if self == player:
             await self.context.exit(
@@ -114,14 +122,18 @@ class Player:
             await self.context.exit(
                 "Cannot set owner, new target already has one.")
 
-        self._set_owner(player, trusts=trusts)
+        claimed = await DBUser.claim_controller(self.db._id, new_owner_id=player.db._id, trusts=trusts)
+        self.context.loader.invalidate(self.db)
+        if not claimed:
+            await self.context.exit(
+                "Cannot set owner, new target already has one.")
 
         await self.notify(f"Your owner is now {player.discord.mention}.")
         await player.notify(f"You now own {self.discord.mention}.")
         if trusts:
             await player.notify(f"{self.discord.mention} now trusts you!")
 
-    @beartype
+    @typechecked
     async def free_all_owned(self):
         if not hasattr(self, "discord"):
             raise InvalidScope
@@ -131,24 +143,18 @@ class Player:
             return
 
         for owned_player in owned:
-            owned_player._set_owner(owned_player, trusts=False)
-            owned_player.context = ModelNoneCTX.from_other(
-                owned_player.context)
-
-            try:
-                owned_player.discord = await owned_player._get_discord(owned_player.db.discord_id)
-                await owned_player.notify(f"You are no longer owned by {self.discord.mention}.")
-            except ManagedCommandError:
-                pass
-
-    @beartype
-    def _set_owner(self, player: Player, *, trusts: bool):
+            await owned_player._set_owner(owned_player, trusts=False)
+        await self.notify_all(owned, f"You are no longer owned by {self.discord.mention}.")
+
+    @typechecked
+    async def _set_owner(self, player: Player, *, trusts: bool):
         if not hasattr(self, "db") or not hasattr(player, "db"):
             raise InvalidScope
-        DBUser.set_controller(
+        await DBUser.set_controller(
             self.db._id, new_owner_id=player.db._id, trusts=trusts)
+        self.context.loader.invalidate(self.db)
 
-    @beartype
+    @typechecked
     def is_owned_by(self, player: Player) -> bool:
         """Whether the player specified by argument is owned by the player the method is called on
         raises InvalidScope if not run on instances with initialised db"""
@@ -156,7 +162,7 @@ class Player:
             raise InvalidScope
         return player.db._id == self.db.controller
 
-    @beartype
+    @typechecked
     def owns(self, player: Player) -> bool:
         """Whether the player specified by argument owns the player the method is called on
         raises InvalidScope if not run on instances with initialised db"""
@@ -165,15 +171,24 @@ class Player:
         return self.db._id == player.db.controller
 
     @property
-    @beartype
+    @typechecked
     def has_owner(self) -> bool:
         """Whether the player has an owner
         raises InvalidScope if not run on instances with initialised db"""
         return not self.owns(self)
 
-    @beartype
+    @typechecked
     async def mention_owner(self, context: Optional[ModelContext] = None) -> Optional[str]:
-        """Returns mention string for player's owner"""
+        """Returns mention string for player's owner
+        Uses the owner record of players from profile_from_mention, instead of loading the owner"""
+        if hasattr(self, "owner_db"):
+            owner_db: Optional[OwnerRecord] = self.owner_db
+            if owner_db is None:
+                await (context or self.context).exit(f"Database entry not found: {self.db.controller}")
+            if owner_db._id == self.db._id:
+                return None
+            return f"<@{owner_db.discord_id}>"
+
         owner = await self.get_owner(get_discord=True, context=context)
         if owner == self:
             return None
@@ -187,7 +202,8 @@ class Player:
         raises InvalidScope if not run on instances with initialised db"""
         if not hasattr(self, "db"):
             raise InvalidScope
-        controlling: List[DBUser] = DBUser.get_owned(self.db._id)
+        controlling: List[UserRecord] = await DBUser.get_owned(self.db._id)
+        self.context.loader.add_records(controlling)
 
         coroutines: List[Coroutine] = [Player.from_db_user(
             controlled, context=self.context) for controlled in controlling]
@@ -200,36 +216,39 @@ class Player:
             return owned
 
     @property
-    @beartype
-    def derelict(self) -> bool:
-        """whether the user is currently derelict
+    @typechecked
+    def last_active(self) -> datetime:
+        """last active date, including activity not yet written to the database
         raises InvalidScope if not run on instance with initialised db"""
         if not hasattr(self, "db"):
             raise InvalidScope
-        return datetime.utcnow() - self.db.last_active > self.context.bot.derelict_time
+        return last_active_tracker.last_active(self.db.discord_id, default=self.db.last_active)
+
+    @property
+    @typechecked
+    def derelict(self) -> bool:
+        """whether the user is currently derelict
+        raises InvalidScope if not run on instance with initialised db"""
+        return datetime.utcnow() - self.last_active > self.context.bot.derelict_time
 
     @property
-    @beartype
+    @typechecked
     def deleteable(self) -> bool:
         """whether the user is currently deletable
         raises InvalidScope if not run on instance with initialised db"""
-        if not hasattr(self, "db"):
-            raise InvalidScope
-        return datetime.utcnow() - self.db.last_active > self.context.bot.user_delete_time
+        return datetime.utcnow() - self.last_active > self.context.bot.user_delete_time
 
     @property
-    @beartype
+    @typechecked
     def last_active_str(self) -> Optional[str]:
         """last active date as a string
         raises InvalidScope if not run on instance with initialised db"""
-        if not hasattr(self, "db"):
-            raise InvalidScope
-        if self.db.last_active == datetime.min:
+        if self.last_active == datetime.min:
             return None
-        return self.db.last_active.strftime(self.context.bot.date_format)
+        return self.last_active.strftime(self.context.bot.date_format)
 
     @property
-    @beartype
+    @typechecked
     def join_date_str(self) -> str:
         """join date as a string
         raises InvalidScope if not run on instance with initialised db"""
@@ -237,7 +256,7 @@ class Player:
             raise InvalidScope
         return self.db.join_date.strftime(self.context.bot.date_format)
 
-    @beartype
+    @typechecked
     async def is_administrator(self) -> bool:
         """Whether the user is a bot administrator
         raises InvalidScope if not run on instance with initialised discord"""
@@ -246,7 +265,7 @@ class Player:
         return await self.context.bot.is_owner(self.discord)
 
     @classmethod
-    @beartype
+    @typechecked
     async def from_mention(
         cls,
         mention_string: str,
@@ -256,28 +275,57 @@ class Player:
     ) -> Player:
         """Create a new instance from a mention string
         responds to context and trows ManagedCommandError if not possible"""
+        discord_id = await cls._mention_to_id(mention_string, context=context)
+        return await cls._init(discord_id=discord_id, context=context, **kwargs)
+
+    @classmethod
+    @typechecked
+    async def profile_from_mention(cls, mention_string: str, *, context: ModelContext) -> Player:
+        """from_mention with discord and db, for showing a profile.
+        The record of the owner is loaded in the same query (see DBUser.get_profile), such that mention_owner does not query.
+        responds to context and trows ManagedCommandError if not possible"""
+        discord_id = await cls._mention_to_id(mention_string, context=context)
+        if discord_id == context.bot.application_id:
+            await context.exit("You cannot target the bot")
+
+        try:
+            profile = await DBUser.get_profile(discord_id=discord_id)
+        except UserNotRegisterd:
+            discord_name = await get_player_name(discord_id, bot=context.bot)
+            await context.exit(f"No data found for {discord_name}")
+        context.loader.add_records([profile.user])
+
+        instance = cls(context=context)
+        instance.db: UserRecord = profile.user
+        instance.owner_db: Optional[OwnerRecord] = profile.owner
+        instance.discord: DiscordMember = await instance._get_discord(discord_id)
+        return instance
+
+    @staticmethod
+    @typechecked
+    async def _mention_to_id(mention_string: str, *, context: ModelContext) -> int:
+        """mention_to_id, responds to context and trows ManagedCommandError if not possible"""
         try:
-            discord_id = mention_to_id(mention_string)
+            return mention_to_id(mention_string)
         except ValueError:
             await context.exit(
                 f"{mention_string} is not recognised as a player. Are you sure you used either a mention or a discord user ID?"
             )
-        return await cls._init(discord_id=discord_id, context=context, **kwargs)
 
     @classmethod
-    @beartype
+    @typechecked
     async def from_db_user(
         cls,
-        user: DBUser,
+        user: UserRecord,
         *,
         context: ModelContext,
         get_discord: bool = True,
         get_chaster: bool = False
     ) -> Player:
-        """Initialises a player with regular kwargs from a User object"""
+        """Initialises a player with regular kwargs from a UserRecord"""
 
         instance = cls(context=context)
-        instance.db: DBUser = user
+        instance.db: UserRecord = user
 
         if get_discord:
             instance.discord: DiscordMember = await instance._get_discord(instance.db.discord_id)
@@ -285,7 +333,7 @@ class Player:
         return instance
 
     @classmethod
-    @beartype
+    @typechecked
     async def from_ctx(
         cls,
         ctx: discord.ApplicationContext,
@@ -297,14 +345,15 @@ class Player:
         """Initialises a player with regular kwargs for the player who excecuted the command"""
         instance = cls(context=ModelACTX(ctx))
         instance.discord = ctx.user
+        instance.context.loader.add_discord(ctx.user)
 
         if get_db == True or as_user is not None:
-            instance.db: DBUser = await instance._get_db(discord_id=ctx.user.id, as_user=as_user)
+            instance.db: UserRecord = await instance._get_db(discord_id=ctx.user.id, as_user=as_user)
 
         return instance
 
     @classmethod
-    @beartype
+    @typechecked
     async def _init(
         cls,
         *,
@@ -337,14 +386,14 @@ class Player:
             get_db = True
 
         if get_db == True or as_user is not None:
-            instance.db: DBUser = await instance._get_db(discord_id=discord_id, db_id=db_id, as_user=as_user)
+            instance.db: UserRecord = await instance._get_db(discord_id=discord_id, db_id=db_id, as_user=as_user)
 
         if get_discord:
             instance.discord: DiscordMember = await instance._get_discord(discord_id or instance.db.discord_id)
 
         return instance
 
-    @beartype
+    @typechecked
     async def _get_discord(self, discord_id: int) -> DiscordMember:
         """gets the discord instance of the player, or returns excisting one.
         responds to context and trows ManagedCommandError if not possible"""
@@ -354,32 +403,26 @@ class Player:
         if discord_id == self.context.bot.application_id:
             await self.context.exit("You cannot target the bot")
 
-        member: Optional[DiscordMember] = self.context.bot.get_user(discord_id)
-        if member is not None:
-            return member
-
-        try:
-            member = await self.context.bot.fetch_user(discord_id)
-            self.fetched = True
-            return member
-        except discord.NotFound:
+        member: Optional[DiscordMember] = await self.context.loader.get_discord(discord_id, bot=self.context.bot)
+        if member is None:
             await self.context.exit(f"Could not find a user of the ID {discord_id}")
+        return member
 
-    @beartype
+    @typechecked
     async def _get_db(
         self,
         *,
         discord_id: Optional[int] = None,
         db_id: Optional[ObjectId] = None,
         as_user: Optional[int] = None
-    ) -> DBUser:
-        """Gets the db instance of the player, or returns excisting one.
+    ) -> UserRecord:
+        """Gets the db record of the player, or returns excisting one.
         responds to context and trows ManagedCommandError if not possible"""
         if hasattr(self, "db") and as_user is None:
             return self.db
 
         try:
-            db = DBUser.get_user(
+            db = await self.context.loader.get_record(
                 discord_id=discord_id,
                 db_id=db_id,
                 as_user=as_user
@@ -392,7 +435,7 @@ class Player:
             elif db_id is not None:
                 await self.context.exit(f"Database entry not found: {db_id}")
             else:
-                raise ValueError  # DBUser.get_user should have already done this, but better safe than sorry
+                raise ValueError  # PlayerLoader.get_record should have already done this, but better safe than sorry
 
         return db
 
@@ -408,6 +451,6 @@ class Player:
             return NotImplemented
 
 
-@beartype
+@typechecked
 async def create_player(*args, **kwargs) -> Player:
     return await Player._init(*args, **kwargs)
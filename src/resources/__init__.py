@@ -1,11 +1,11 @@
-from .base import create_error_embed, create_notification_embed
+from .base import create_error_embed, create_notification_embed, create_notifications_embed
 from .profile import create_profile_embed
 from .requests import create_controlling_request_embed, create_controlling_request_view
-from .welcome import create_welcome_embed, create_welcome_view
+from .welcome import create_welcome_embed, create_burst_welcome_embed, create_welcome_view
 
 __all__ = (
-    "create_error_embed", "create_notification_embed",
+    "create_error_embed", "create_notification_embed", "create_notifications_embed",
     "create_profile_embed",
     "create_controlling_request_embed", "create_controlling_request_view",
-    "create_welcome_embed", "create_welcome_view"
+    "create_welcome_embed", "create_burst_welcome_embed", "create_welcome_view"
 )
@@ -1,6 +1,7 @@
 import discord
 import discord.ui as ui
-from beartype import beartype
+from beartype.typing import List
+from utils import typechecked
 
 from models import ManagedCommandError
 
@@ -24,7 +25,7 @@ class BaseView(ui.View):
         self.stop()
 
 
-@beartype
+@typechecked
 def create_error_embed(message: str) -> discord.Embed:
     embed = discord.Embed(
         title=f"**Something went wrong!**",
@@ -34,7 +35,7 @@ def create_error_embed(message: str) -> discord.Embed:
     return embed
 
 
-@beartype
+@typechecked
 def create_notification_embed(message: str) -> discord.Embed:
     embed = discord.Embed(
         title=f"**You got a notification.**",
@@ -42,3 +43,16 @@ def create_notification_embed(message: str) -> discord.Embed:
         colour=0xA343CB
     )
     return embed
+
+
+@typechecked
+def create_notifications_embed(messages: List[str]) -> discord.Embed:
+    """A single embed for several notifications of the same user, sent together"""
+    if len(messages) == 1:
+        return create_notification_embed(messages[0])
+    embed = discord.Embed(
+        title=f"**You got {len(messages)} notifications.**",
+        description="\n\n".join(messages),
+        colour=0xA343CB
+    )
+    return embed
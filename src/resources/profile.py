@@ -1,9 +1,9 @@
 import discord
-from beartype import beartype
+from utils import typechecked
 from beartype.typing import Optional
 
 
-@beartype
+@typechecked
 def create_profile_embed(
         *,
         discord_name: str,
@@ -1,13 +1,13 @@
 import discord
 import discord.ui as ui
-from beartype import beartype
+from utils import typechecked
 
 from models import Player, ModelVCTX
 from .base import BaseView
 
 
 class ControllingRequestView(BaseView):
-    @beartype
+    @typechecked
     def __init__(self, *, instantiator: Player, target: Player, bot: discord.ext.commands.Bot):
         super().__init__(timeout=60)
         self.instantiator: Player = instantiator
@@ -73,12 +73,12 @@ class ControllingRequestView(BaseView):
             )
 
 
-@beartype
+@typechecked
 def create_controlling_request_view(**kwargs) -> BaseView:
     return ControllingRequestView(**kwargs)
 
 
-@beartype
+@typechecked
 def create_controlling_request_timed_out_embed(
         *,
         instantiator_name: str,
@@ -108,7 +108,7 @@ def create_controlling_request_timed_out_embed(
     return embed
 
 
-@beartype
+@typechecked
 def create_controlling_request_embed(
         *,
         instantiator_name: str,
@@ -1,8 +1,9 @@
 import discord
-from beartype import beartype
+from beartype.typing import List
+from utils import typechecked
 
 
-@beartype
+@typechecked
 def create_welcome_embed(
         title: str,
         member_join: str,
@@ -25,9 +26,23 @@ def create_welcome_embed(
     return embed
 
 
+@typechecked
+def create_burst_welcome_embed(
+        title: str,
+        member_names: List[str]
+) -> discord.Embed:
+    """A single welcome embed for many members, used in burst mode"""
+
+    return discord.Embed(
+        title=title,
+        description=" ".join(member_names),
+        colour=0xA343CB
+    )
+
+
 # This has to be done with a function instead of by subclassing View
 # The @button declarator does not support links
-@beartype
+@typechecked
 def create_welcome_view(
         rules_link: str,
         rules_message: str,
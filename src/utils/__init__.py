@@ -1,9 +1,21 @@
-from .scheduler import scheduler_setup, sched
-from .helpers import classproperty, mention_to_id, get_player_name
+from .typecheck import typechecked
+from .scheduler import scheduler_setup, sched, scheduled_job, run_job_now
+from .helpers import classproperty, mention_to_id, get_player_name, chunked
 from .types import MessageChannel, DiscordMember
+from .resolver import UserResolver, user_resolver
+from .metrics import metrics, loop_lag_monitor, timed_listener
+from .send_queue import ChannelSendQueue, channel_send_queue
+from .batcher import WindowBatcher
+from .startup import StartupTimer, startup_timer
 
 __all__ = (
-    "scheduler_setup", "sched",
-    "classproperty", "mention_to_id", "get_player_name",
+    "typechecked",
+    "scheduler_setup", "sched", "scheduled_job", "run_job_now",
+    "classproperty", "mention_to_id", "get_player_name", "chunked",
     "MessageChannel", "DiscordMember",
+    "UserResolver", "user_resolver",
+    "metrics", "loop_lag_monitor", "timed_listener",
+    "ChannelSendQueue", "channel_send_queue",
+    "WindowBatcher",
+    "StartupTimer", "startup_timer",
 )
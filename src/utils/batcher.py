@@ -0,0 +1,32 @@
+import asyncio
+import logging
+
+from beartype.typing import Any, Awaitable, Callable, Dict, Hashable, List
+
+from .typecheck import typechecked
+
+
+class WindowBatcher:
+    """Collects items per key, and hands all items of a key to callback at once,
+    window seconds after the first item of that key came in."""
+
+    @typechecked
+    def __init__(self, callback: Callable[[Any, List[Any]], Awaitable[Any]]):
+        self.callback = callback
+        self._items: Dict[Hashable, List[Any]] = {}
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+
+    def add(self, key: Hashable, item: Any, *, window: float):
+        """Adds item to the batch of key. window is only used when this starts a new batch."""
+        self._items.setdefault(key, []).append(item)
+        if key not in self._tasks:
+            self._tasks[key] = asyncio.create_task(self._flush_after(key, window))
+
+    async def _flush_after(self, key: Hashable, window: float):
+        await asyncio.sleep(window)
+        items = self._items.pop(key)
+        del self._tasks[key]
+        try:
+            await self.callback(key, items)
+        except Exception:
+            logging.exception(f"Could not process a batch of {len(items)} items for {key}")
@@ -1,8 +1,9 @@
 import discord
-from beartype import beartype
-from beartype.typing import Callable, Any, Optional, Union
+from .typecheck import typechecked
+from beartype.typing import Callable, Any, Optional, Union, Iterable, Iterator, List
 
 from .types import DiscordMember
+from .resolver import user_resolver
 
 
 class classproperty:
@@ -10,16 +11,16 @@ class classproperty:
     Those two cannot be combined by default (or, only in 3.8 - 3.10, with dropped support in 3.11)
     Yes, I could import an external library just for this, but this is only four lines of code..."""
 
-    @beartype
+    @typechecked
     def __init__(self, fget: Callable):
         self.fget = fget
 
-    @beartype
+    @typechecked
     def __get__(self, owner_self: Any, owner_cls: type):
         return self.fget(owner_cls)
 
 
-@beartype
+@typechecked
 def mention_to_id(mention_string: str) -> int:
     """py-chord returns a mention-string for the discord.User and disord.Channel Option in commands
     This, according to the documentation, should not happen, but alas.
@@ -27,15 +28,23 @@ def mention_to_id(mention_string: str) -> int:
     return int(mention_string.strip("<>@!#"))
 
 
-@beartype
+@typechecked
+def chunked(iterable: Iterable, size: int) -> Iterator[List]:
+    """Splits the iterable into lists of at most size items, for batched database operations"""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+@typechecked
 async def get_player_name(discord_id: int, *, bot: discord.ext.commands.Bot) -> str:
     """Gets the best match for the player name the bot can find"""
-    player: Optional[DiscordMember] = bot.get_user(int(discord_id))
-    if player:
-        return str(player)
-
-    try:
-        player = await bot.fetch_user(int(discord_id))
-        return str(player)
-    except discord.NotFound:
+    player: Optional[DiscordMember] = await user_resolver.get(int(discord_id), bot=bot)
+    if player is None:
         return f"User: {str(discord_id)}"
+    return str(player)
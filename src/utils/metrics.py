@@ -0,0 +1,191 @@
+import asyncio
+import functools
+import json
+import logging
+import time
+
+from .typecheck import typechecked
+from beartype.typing import Callable, Dict, List, Optional, Tuple, Union
+
+Labels = Tuple[Tuple[str, str], ...]
+Buckets = Tuple[Union[int, float], ...]
+
+# Upper bounds in seconds, chosen to span a fast cache hit up to a stalled event loop.
+DEFAULT_BUCKETS: Buckets = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
+# Upper bounds in seconds for the startup, which takes much longer than anything else.
+STARTUP_BUCKETS: Buckets = (
+    0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120
+)
+# Upper bounds for metrics that count things instead of measuring time.
+COUNT_BUCKETS: Buckets = (
+    1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000
+)
+
+
+class Histogram:
+    """A Prometheus style histogram: counts per upper bound, the total count and the sum of all observations."""
+
+    @typechecked
+    def __init__(self, buckets: Buckets = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts: List[int] = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """The (upper bound, cumulative count) pairs, including +Inf"""
+        result = []
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            result.append((str(bound), total))
+        result.append(("+Inf", self.count))
+        return result
+
+
+class Metrics:
+    """Registry of all the histograms of the bot, keyed by metric name and labels.
+    Only to be used from the event loop thread."""
+
+    def __init__(self):
+        self.histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self.descriptions: Dict[str, str] = {}
+        self.buckets: Dict[str, Buckets] = {}
+
+    def describe(self, name: str, description: str, *, buckets: Buckets = DEFAULT_BUCKETS):
+        self.descriptions[name] = description
+        self.buckets[name] = buckets
+
+    def observe(self, name: str, value: float, **labels: str):
+        key: Labels = tuple(sorted(labels.items()))
+        series = self.histograms.setdefault(name, {})
+        if key not in series:
+            series[key] = Histogram(self.buckets.get(name, DEFAULT_BUCKETS))
+        series[key].observe(value)
+
+    def reset(self):
+        self.histograms = {}
+
+    def to_json(self) -> str:
+        snapshot = {
+            name: [
+                {
+                    "labels": dict(labels),
+                    "count": histogram.count,
+                    "sum": histogram.sum,
+                    "buckets": dict(histogram.cumulative())
+                }
+                for labels, histogram in series.items()
+            ]
+            for name, series in self.histograms.items()
+        }
+        return json.dumps(snapshot, indent=2)
+
+    def to_prometheus(self) -> str:
+        lines = []
+        for name, series in self.histograms.items():
+            if name in self.descriptions:
+                lines.append(f"# HELP {name} {self.descriptions[name]}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, histogram in series.items():
+                for bound, count in histogram.cumulative():
+                    bucket_labels = _format_labels(labels + (("le", bound),))
+                    lines.append(f"{name}_bucket{bucket_labels} {count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    inner = ",".join(f'{key}="{value}"' for key, value in labels)
+    return "{" + inner + "}"
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes up a sleeping task, which is the time the loop was blocked.
+    Lags above warn_threshold seconds are logged."""
+
+    @typechecked
+    def __init__(self, *, interval: float = 0.5, warn_threshold: float = 1.0):
+        self.interval = interval
+        self.warn_threshold = warn_threshold
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Starts the monitor, can be called multiple times without issue"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - start - self.interval)
+            metrics.observe("event_loop_lag_seconds", lag)
+            if lag > self.warn_threshold:
+                logging.warning(f"Event loop was blocked for {lag:.3f}s")
+
+
+def timed_listener(func: Callable) -> Callable:
+    """Decorator that records the duration of a cog listener, to be put below @commands.Cog.listener()"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            metrics.observe(
+                "listener_duration_seconds",
+                time.perf_counter() - start,
+                listener=func.__qualname__
+            )
+    return wrapper
+
+
+metrics = Metrics()
+metrics.describe("event_loop_lag_seconds",
+                 "How late the event loop woke up a sleeping task")
+metrics.describe("command_duration_seconds",
+                 "Duration of slash commands, from the before invoke hook up to the after invoke hook")
+metrics.describe("listener_duration_seconds", "Duration of cog listeners")
+metrics.describe("database_call_seconds",
+                 "Duration of database calls including the executor queue, per collection and operation")
+metrics.describe("startup_phase_seconds", "Duration of every phase of the startup",
+                 buckets=STARTUP_BUCKETS)
+metrics.describe("startup_seconds", "Time from process start up to the first on_ready",
+                 buckets=STARTUP_BUCKETS)
+metrics.describe("database_flush_seconds",
+                 "Duration of the single flush at the end of every database unit of work")
+metrics.describe("database_session_objects",
+                 "Objects in the identity map of a session at the end of a database unit of work, per collection",
+                 buckets=COUNT_BUCKETS)
+metrics.describe("scheduled_job_seconds", "Duration of every run of a scheduled job",
+                 buckets=STARTUP_BUCKETS)
+metrics.describe("scheduled_job_rows", "Database rows a run of a scheduled job touched",
+                 buckets=COUNT_BUCKETS)
+metrics.describe("scheduled_job_skipped", "Runs of scheduled jobs that were missed, overlapped or failed",
+                 buckets=COUNT_BUCKETS)
+metrics.describe("notification_delay_seconds",
+                 "Time from queueing a notification up to sending its DM",
+                 buckets=STARTUP_BUCKETS)
+metrics.describe("notifications_per_dm", "Notifications sent together in a single DM",
+                 buckets=COUNT_BUCKETS)
+
+loop_lag_monitor = LoopLagMonitor()
@@ -0,0 +1,87 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+import discord
+from .typecheck import typechecked
+from beartype.typing import Dict, Optional, Tuple
+
+from .types import DiscordMember
+
+
+class UserResolver:
+    """Resolves discord users that are not in the cache of the bot, with as few REST calls as possible.
+    Features:
+    - A bounded LRU cache of fetched users, entries expire after ttl seconds
+    - Negative caching of users discord reports as not found, those expire after negative_ttl seconds
+    - Concurrent requests for the same user share a single fetch
+    - At most max_concurrent fetches are in flight at any time, to stay clear of the rate limits"""
+
+    @typechecked
+    def __init__(
+        self,
+        *,
+        max_size: int = 4096,
+        ttl: float = 600,
+        negative_ttl: float = 60,
+        max_concurrent: int = 4
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._cache: OrderedDict[int, Tuple[float, Optional[DiscordMember]]] = OrderedDict()
+        self._pending: Dict[int, asyncio.Task] = {}
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+
+    @typechecked
+    async def get(self, discord_id: int, *, bot: discord.ext.commands.Bot) -> Optional[DiscordMember]:
+        """Returns the user from the cache of the bot if possible, and fetches it otherwise.
+        Returns None if the user does not exist."""
+        user: Optional[DiscordMember] = bot.get_user(discord_id)
+        if user is not None:
+            return user
+        return await self.fetch(discord_id, bot=bot)
+
+    @typechecked
+    async def fetch(self, discord_id: int, *, bot: discord.ext.commands.Bot) -> Optional[DiscordMember]:
+        """Fetches the user through the resolver cache, without looking at the cache of the bot.
+        Returns None if the user does not exist."""
+        try:
+            expires, user = self._cache[discord_id]
+            if expires > time.monotonic():
+                self._cache.move_to_end(discord_id)
+                return user
+            del self._cache[discord_id]
+        except KeyError:
+            pass
+
+        task = self._pending.get(discord_id)
+        if task is None:
+            task = asyncio.create_task(self._fetch(discord_id, bot=bot))
+            self._pending[discord_id] = task
+            task.add_done_callback(
+                lambda _: self._pending.pop(discord_id, None))
+
+        # Shielded, such that a cancelled caller does not cancel the fetch for the others.
+        return await asyncio.shield(task)
+
+    def invalidate(self, discord_id: int):
+        self._cache.pop(discord_id, None)
+
+    async def _fetch(self, discord_id: int, *, bot: discord.ext.commands.Bot) -> Optional[DiscordMember]:
+        async with self._semaphore:
+            try:
+                user: Optional[DiscordMember] = await bot.fetch_user(discord_id)
+                ttl = self.ttl
+            except discord.NotFound:
+                user = None
+                ttl = self.negative_ttl
+
+        self._cache[discord_id] = (time.monotonic() + ttl, user)
+        self._cache.move_to_end(discord_id)
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+        return user
+
+
+user_resolver = UserResolver()
@@ -1,20 +1,91 @@
+import functools
+import logging
+import time
+from datetime import datetime, timezone
+
+from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_MAX_INSTANCES, EVENT_JOB_MISSED, JobEvent
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from beartype.typing import Awaitable, Callable, Optional
+
+from .metrics import metrics
+
+# A job is never started while a previous run of it is still going, and runs that were missed are run once.
+sched = AsyncIOScheduler({
+    'apscheduler.timezone': 'UTC',
+    'apscheduler.job_defaults.max_instances': 1,
+    'apscheduler.job_defaults.coalesce': True,
+    'apscheduler.job_defaults.misfire_grace_time': 300,
+})
 
-sched = AsyncIOScheduler({'apscheduler.timezone': 'UTC'})
+JOB_EVENTS = {
+    EVENT_JOB_MISSED: "missed",
+    EVENT_JOB_MAX_INSTANCES: "still_running",
+    EVENT_JOB_ERROR: "error",
+}
 
 
-def scheduler_setup():
+def scheduler_setup(collection: str = "jobs"):
     """Congigures the global varibale sched, that contains the AsyncIOScheduler, and then starts it as a coroutine
 
-    Can be called multiple times without issue. 
-    Each cog that uses sched should define any callables in on_connect, and call this function in on_ready"""
+    Can be called multiple times without issue.
+    Each cog that uses sched should define any callables in on_connect, and call this function in on_ready.
+    Processes that share the database but run different shards need their own jobstore collection."""
     from database.connect import DBManager
     try:
         sched.add_jobstore(
             "mongodb",
             database=DBManager.db.name,
-            client=DBManager.db.client
+            client=DBManager.db.client,
+            collection=collection
         )
+        sched.add_listener(job_listener, EVENT_JOB_MISSED | EVENT_JOB_MAX_INSTANCES | EVENT_JOB_ERROR)
         sched.start()
     except ValueError:
         pass
+
+
+def job_listener(event: JobEvent):
+    """Logs and counts the runs of jobs that were skipped or failed"""
+    reason = JOB_EVENTS[event.code]
+    metrics.observe("scheduled_job_skipped", 1, job=event.job_id, reason=reason)
+    exception = getattr(event, "exception", None)
+    if exception is not None:
+        logging.error(f"Scheduled job {event.job_id} failed: {exception!r}")
+    else:
+        logging.warning(f"Scheduled job {event.job_id} was skipped: {reason}")
+
+
+def scheduled_job(name: str, *, heavy: bool = False) -> Callable:
+    """Decorator for the coroutine functions the scheduler runs.
+    Records the duration of every run, and the rows it touched if the job returns that amount.
+    The database calls of heavy jobs run on the job_executor of DBManager, see DBManager.background."""
+    def decorator(func: Callable[[], Awaitable[Optional[int]]]) -> Callable[[], Awaitable[Optional[int]]]:
+        @functools.wraps(func)
+        async def wrapper() -> Optional[int]:
+            from database.connect import DBManager
+            start = time.perf_counter()
+            if heavy:
+                with DBManager.background():
+                    rows = await func()
+            else:
+                rows = await func()
+            duration = time.perf_counter() - start
+
+            metrics.observe("scheduled_job_seconds", duration, job=name)
+            if rows is not None:
+                metrics.observe("scheduled_job_rows", rows, job=name)
+            if heavy:
+                logging.info(f"Scheduled job {name} took {duration:.3f}s, touched {rows} rows")
+            return rows
+        return wrapper
+    return decorator
+
+
+def run_job_now(job_id: str) -> bool:
+    """Moves the next run of the job to now, the overlap guard still keeps a running job from starting twice.
+    Returns False if there is no such job"""
+    job = sched.get_job(job_id)
+    if job is None:
+        return False
+    job.modify(next_run_time=datetime.now(timezone.utc))
+    return True
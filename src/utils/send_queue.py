@@ -0,0 +1,62 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+import discord
+from beartype.typing import Any, Deque, Dict, Tuple
+
+from .typecheck import typechecked
+from .types import MessageChannel
+
+
+class ChannelSendQueue:
+    """Sends messages through a queue per channel, instead of all at once.
+    Features:
+    - Messages to the same channel are sent one after another, in order
+    - At most rate messages are sent per period seconds to a channel, staying clear of the per channel rate limit
+    - At most max_pending messages wait per channel, the oldest are dropped (and logged) on overflow"""
+
+    @typechecked
+    def __init__(self, *, rate: int = 5, period: float = 5.0, max_pending: int = 50):
+        self.rate = rate
+        self.period = period
+        self.max_pending = max_pending
+        self._pending: Dict[int, Deque[Tuple[MessageChannel, Dict[str, Any]]]] = {}
+        self._sent: Dict[int, Deque[float]] = {}
+        self._workers: Dict[int, asyncio.Task] = {}
+
+    def send(self, channel: MessageChannel, **kwargs):
+        """Queues channel.send(**kwargs), and returns without waiting for it to be sent"""
+        pending = self._pending.setdefault(channel.id, deque())
+        if len(pending) >= self.max_pending:
+            pending.popleft()
+            logging.warning(f"Send queue of channel {channel.id} is full, dropped the oldest message")
+        pending.append((channel, kwargs))
+
+        worker = self._workers.get(channel.id)
+        if worker is None or worker.done():
+            self._workers[channel.id] = asyncio.create_task(self._run(channel.id))
+
+    async def _run(self, channel_id: int):
+        pending = self._pending[channel_id]
+        sent = self._sent.setdefault(channel_id, deque())
+        while pending:
+            if len(sent) >= self.rate:
+                wait = sent[0] + self.period - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                sent.popleft()
+
+            channel, kwargs = pending.popleft()
+            try:
+                await channel.send(**kwargs)
+            except discord.HTTPException as error:
+                logging.warning(f"Could not send queued message to channel {channel_id}: {error}")
+            sent.append(time.monotonic())
+
+        del self._pending[channel_id]
+        del self._workers[channel_id]
+
+
+channel_send_queue = ChannelSendQueue()
@@ -0,0 +1,49 @@
+import logging
+import time
+from contextlib import contextmanager
+
+from beartype.typing import Dict, Iterator, Optional
+
+from .metrics import metrics
+
+
+class StartupTimer:
+    """Records the duration of every phase of the startup, and the total time from process start up to the first on_ready.
+    Phases are logged as they finish, the summary is logged once the bot is ready."""
+
+    def __init__(self):
+        self.started: float = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.total: Optional[float] = None
+
+    def set_started(self, started: float):
+        """Moves the start back to the given time.perf_counter() value, taken before the first imports"""
+        self.started = started
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, seconds: float):
+        self.phases[name] = seconds
+        metrics.observe("startup_phase_seconds", seconds, phase=name)
+        logging.info(f"Startup phase {name} took {seconds:.3f}s")
+
+    def ready(self):
+        """Logs the time since process start, only the first call has any effect (on_ready also fires on reconnects)"""
+        if self.total is not None:
+            return
+        self.total = time.perf_counter() - self.started
+        metrics.observe("startup_seconds", self.total)
+        slowest = ", ".join(
+            f"{name} {seconds:.3f}s"
+            for name, seconds in sorted(self.phases.items(), key=lambda item: item[1], reverse=True)[:5]
+        )
+        logging.info(f"=== Ready after {self.total:.3f}s === slowest phases: {slowest}")
+
+
+startup_timer = StartupTimer()
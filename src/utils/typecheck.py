@@ -0,0 +1,61 @@
+import asyncio
+import functools
+import logging
+import os
+import random
+
+from beartype import beartype, BeartypeConf, BeartypeStrategy
+from beartype.typing import Callable
+
+POLICIES = ("strict", "sample", "off")
+
+# Read once, the decorators are applied when the modules are imported.
+_policy: str = os.getenv("TYPECHECK", "strict").lower()
+_sample_rate: float = float(os.getenv("TYPECHECK_SAMPLE_RATE", "0.01"))
+
+if _policy not in POLICIES:
+    logging.warning(f"Unknown TYPECHECK policy {_policy!r}, falling back to strict")
+    _policy = "strict"
+
+
+def configure(policy: str, *, sample_rate: float = 0.01):
+    """Overrides the policy of the environment.
+    Only affects functions decorated after the call, so it has to run before the bot modules are imported."""
+    global _policy, _sample_rate
+    if policy not in POLICIES:
+        raise ValueError(f"policy has to be one of {POLICIES}, not {policy!r}")
+    _policy = policy
+    _sample_rate = sample_rate
+
+
+def get_policy() -> str:
+    return _policy
+
+
+def typechecked(func: Callable) -> Callable:
+    """Drop in replacement of @beartype that follows the project-wide runtime type-checking policy.
+    Set with the TYPECHECK environment variable:
+    - strict (default): every call is checked by beartype
+    - sample: a random TYPECHECK_SAMPLE_RATE fraction of the calls is checked, the rest calls the function directly
+    - off: the function is returned undecorated, without any overhead"""
+    if _policy == "off":
+        return beartype(conf=BeartypeConf(strategy=BeartypeStrategy.O0))(func)
+
+    checked = beartype(func)
+    if _policy == "strict":
+        return checked
+
+    rate = _sample_rate
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def sampled(*args, **kwargs):
+            if random.random() < rate:
+                return await checked(*args, **kwargs)
+            return await func(*args, **kwargs)
+    else:
+        @functools.wraps(func)
+        def sampled(*args, **kwargs):
+            if random.random() < rate:
+                return checked(*args, **kwargs)
+            return func(*args, **kwargs)
+    return sampled